@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Benchmark the image pipeline on synthetic fixtures and track regressions.
+
+Generates a fixture set of images (large camera-style JPEGs, RGBA and
+palette PNGs, large PNG screenshots) plus a PPTX deck built from them, then
+times each stage in a fresh process and records wall time, images/sec,
+peak RSS and output bytes. Results are written as JSON; given a baseline,
+the run fails if any stage regresses past the threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Fixture images: name -> (width, height, mode, kind)
+FIXTURES = {
+    "photo_24mp.jpg": (6000, 4000, "RGB", "photo"),
+    "photo_large.jpg": (4000, 3000, "RGB", "photo"),
+    "photo_medium.jpg": (1600, 1200, "RGB", "photo"),
+    "logo_rgba.png": (800, 800, "RGBA", "graphic"),
+    "chart_palette.png": (1200, 900, "P", "graphic"),
+    "screenshot_1.png": (2560, 1440, "RGB", "screenshot"),
+    "screenshot_2.png": (2560, 1600, "RGB", "screenshot"),
+    "screenshot_3.png": (1920, 1080, "RGB", "screenshot"),
+}
+
+# Metrics where a larger value is a regression
+REGRESSION_METRICS = ("wall_time", "peak_rss_mb", "output_bytes")
+
+def _synthetic_pixels(width, height, kind, rng):
+    """Build an RGB pixel array that compresses roughly like the given kind of image."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    if kind == "photo":
+        # Smooth gradients plus sensor-like noise
+        base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200
+        pixels = base + rng.normal(0, 12, (height, width, 3))
+    elif kind == "screenshot":
+        # Flat UI panels with fine, high-contrast "text" rows
+        pixels = np.full((height, width, 3), 245, dtype=np.float32)
+        pixels[:, : width // 5] = (40, 60, 90)
+        text_rows = (y.astype(int) // 6) % 4 == 0
+        glyphs = rng.random((height, width)) < 0.35
+        pixels[text_rows & glyphs] = 30
+    else:
+        # Few flat colour blocks, as in logos and charts
+        blocks = ((x // (width / 8)).astype(int) + (y // (height / 8)).astype(int)) % 5
+        palette = rng.integers(0, 256, (5, 3))
+        pixels = palette[blocks].astype(np.float32)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+def generate_fixtures(fixtures_dir, scale=1.0, seed=0):
+    """Write the FIXTURES images (dimensions multiplied by scale) and return their paths."""
+    fixtures_dir = Path(fixtures_dir)
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    
+    paths = []
+    for name, (width, height, mode, kind) in FIXTURES.items():
+        width, height = max(16, int(width * scale)), max(16, int(height * scale))
+        img = Image.fromarray(_synthetic_pixels(width, height, kind, rng))
+        if mode == "RGBA":
+            alpha = Image.linear_gradient('L').resize(img.size)
+            img.putalpha(alpha)
+        elif mode == "P":
+            img = img.quantize(colors=64)
+        path = fixtures_dir / name
+        img.save(path, quality=95) if path.suffix == ".jpg" else img.save(path)
+        paths.append(path)
+    return paths
+
+def generate_deck(deck_path, image_paths, slides=24):
+    """Build a PPTX deck that cycles through image_paths, one picture and caption per slide."""
+    from pptx import Presentation
+    from pptx.util import Inches
+    
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        caption = slide.shapes.add_textbox(Inches(0.5), Inches(0.3), Inches(9), Inches(1))
+        caption.text_frame.text = f"Scholarship year {2016 + i % 10}, slide {i + 1}"
+        slide.shapes.add_picture(str(image_paths[i % len(image_paths)]), Inches(1), Inches(1.5), width=Inches(8))
+    prs.save(deck_path)
+    return deck_path
+
+def _peak_rss_mb():
+    """Peak RSS of this process and its finished children, in MB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _dir_bytes(directory):
+    """Total size of the files under a directory."""
+    return sum(path.stat().st_size for path in Path(directory).rglob('*') if path.is_file())
+
+def _stage_compress_image(fixtures_dir, work_dir, workers):
+    from compress_images import compress_image
+    
+    images_dir = Path(shutil.copytree(fixtures_dir / "images", work_dir / "images"))
+    images = [p for p in images_dir.iterdir() if p.suffix in ('.jpg', '.png')]
+    start = time.perf_counter()
+    for path in images:
+        compress_image(path)
+    return time.perf_counter() - start, len(images), _dir_bytes(images_dir)
+
+def _stage_compress_image_full_decode(fixtures_dir, work_dir, workers):
+    from compress_images import compress_image
+    
+    images_dir = Path(shutil.copytree(fixtures_dir / "images", work_dir / "images"))
+    images = [p for p in images_dir.iterdir() if p.suffix in ('.jpg', '.png')]
+    start = time.perf_counter()
+    for path in images:
+        compress_image(path, fast_load=False)
+    return time.perf_counter() - start, len(images), _dir_bytes(images_dir)
+
+def _stage_compress_all_images(fixtures_dir, work_dir, workers):
+    from compress_images import compress_all_images, find_images
+    
+    images_dir = Path(shutil.copytree(fixtures_dir / "images", work_dir / "images"))
+    count = len(find_images(images_dir))
+    start = time.perf_counter()
+    compress_all_images(images_dir, workers=workers)
+    return time.perf_counter() - start, count, _dir_bytes(images_dir)
+
+def _stage_extract_slide_content(fixtures_dir, work_dir, workers):
+    from extract_pptx_content import extract_slide_content
+    
+    start = time.perf_counter()
+    slides = extract_slide_content(fixtures_dir / "deck.pptx", work_dir)
+    count = sum(len(slide['images']) for slide in slides)
+    return time.perf_counter() - start, count, _dir_bytes(work_dir / "images")
+
+def _stage_extract_slide_content_streaming(fixtures_dir, work_dir, workers):
+    from extract_pptx_content import extract_slide_content_streaming
+    
+    start = time.perf_counter()
+    slides = extract_slide_content_streaming(fixtures_dir / "deck.pptx", work_dir)
+    count = sum(len(slide['images']) for slide in slides)
+    return time.perf_counter() - start, count, _dir_bytes(work_dir / "images")
+
+STAGES = {
+    "compress_image": _stage_compress_image,
+    "compress_image_full_decode": _stage_compress_image_full_decode,
+    "compress_all_images": _stage_compress_all_images,
+    "extract_slide_content": _stage_extract_slide_content,
+    "extract_slide_content_streaming": _stage_extract_slide_content_streaming,
+}
+
+def _run_stage(name, fixtures_dir, workers):
+    """Run one stage in the current (fresh) process and return its metrics."""
+    sys.path.insert(0, str(Path(__file__).parent))
+    fixtures_dir = Path(fixtures_dir)
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        wall_time, images, output_bytes = STAGES[name](fixtures_dir, Path(work_dir), workers)
+    return {
+        "wall_time": round(wall_time, 4),
+        "images": images,
+        "images_per_sec": round(images / wall_time, 2) if wall_time else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "output_bytes": output_bytes,
+    }
+
+def run_benchmarks(fixtures_dir, stages=tuple(STAGES), repeat=3, workers=1):
+    """
+    Run each stage repeat times, each in a fresh process.
+    
+    The fastest run's wall time is kept (least disturbed by noise) together
+    with the highest peak RSS seen across runs.
+    """
+    results = {}
+    spawn = get_context('spawn')
+    for name in stages:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                runs.append(executor.submit(_run_stage, name, str(fixtures_dir), workers).result())
+        best = min(runs, key=lambda r: r['wall_time'])
+        best['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+        results[name] = best
+        print(f"{name:34s} {best['wall_time']:8.3f}s  {best['images_per_sec'] or 0:8.2f} img/s  "
+              f"{best['peak_rss_mb']:8.1f} MB RSS  {best['output_bytes'] / 1024:10.1f} KB out")
+    return results
+
+def find_regressions(results, baseline, threshold):
+    """List (stage, metric, baseline, current) where current exceeds baseline by more than threshold."""
+    regressions = []
+    for stage, metrics in results.items():
+        for metric in REGRESSION_METRICS:
+            previous = baseline.get(stage, {}).get(metric)
+            if previous and metrics[metric] > previous * (1 + threshold):
+                regressions.append((stage, metric, previous, metrics[metric]))
+    return regressions
+
+def main():
+    """Main benchmark function."""
+    parser = argparse.ArgumentParser(description="Benchmark the image pipeline on synthetic fixtures.")
+    parser.add_argument("--stages", type=lambda value: value.split(','), default=list(STAGES),
+                        help=f"Comma-separated stages to run ({', '.join(STAGES)})")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply fixture dimensions by this factor (e.g. 0.25 for a quick run)")
+    parser.add_argument("--slides", type=int, default=24, help="Slides in the synthetic deck")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is reported")
+    parser.add_argument("--workers", type=int, default=1, help="Workers for compress_all_images")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"),
+                        help="Where to write the results JSON")
+    parser.add_argument("--baseline", type=Path, default=None,
+                        help="Results JSON to compare against; exit non-zero on regression")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed fractional increase over the baseline (default: 0.2)")
+    args = parser.parse_args()
+    
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        fixtures_dir = Path(fixtures_dir)
+        print(f"Generating fixtures (scale={args.scale})...")
+        image_paths = generate_fixtures(fixtures_dir / "images", scale=args.scale)
+        generate_deck(fixtures_dir / "deck.pptx", image_paths, slides=args.slides)
+        
+        results = run_benchmarks(fixtures_dir, args.stages, repeat=args.repeat, workers=args.workers)
+    
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "scale": args.scale,
+        "slides": args.slides,
+        "workers": args.workers,
+        "stages": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline.get("stages", {}), args.threshold)
+        if regressions:
+            print(f"\nRegressions (more than {args.threshold:.0%} over {args.baseline}):")
+            for stage, metric, previous, current in regressions:
+                print(f"  {stage}.{metric}: {previous} -> {current}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
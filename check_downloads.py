@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Check the incremental downloader against a local http.server stand-in.
+
+Serves a temporary directory over HTTP and runs download_all against it
+several times: a first download, a re-run that must be answered with 304
+Not Modified and skip the body, a changed file that must be fetched again,
+a 404 and a truncated response that must leave no partial files behind.
+Exits non-zero if any check fails.
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+
+from extract_website_content import download_all
+
+class RecordingHandler(SimpleHTTPRequestHandler):
+    """Static file handler that records (method, path, status) and can send a truncated body."""
+    
+    def __init__(self, *args, requests_log, **kwargs):
+        self.requests_log = requests_log
+        super().__init__(*args, **kwargs)
+    
+    def do_GET(self):
+        if self.path == '/truncated.png':
+            # Promise more bytes than are sent, then drop the connection
+            self.send_response(200)
+            self.send_header('Content-Length', '100000')
+            self.end_headers()
+            self.wfile.write(b'\x89PNG' * 16)
+            self.close_connection = True
+            return
+        super().do_GET()
+    
+    def log_request(self, code='-', size='-'):
+        self.requests_log.append((self.command, self.path, int(code)))
+    
+    def log_message(self, format, *args):
+        pass
+
+def run_checks(tmp_dir):
+    """Run every check in tmp_dir; returns a list of (description, passed)."""
+    served_dir = tmp_dir / "served"
+    output_dir = tmp_dir / "output"
+    served_dir.mkdir()
+    output_dir.mkdir()
+    manifest_path = output_dir / "download_manifest.json"
+    
+    (served_dir / "logo.png").write_bytes(b'logo v1' * 100)
+    (served_dir / "photo.jpg").write_bytes(b'photo' * 1000)
+    
+    requests_log = []
+    handler = partial(RecordingHandler, directory=str(served_dir), requests_log=requests_log)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    
+    def run(names):
+        requests_log.clear()
+        downloads = [(f"{base_url}/{name}", output_dir / name) for name in names]
+        with redirect_stdout(StringIO()):
+            statuses = download_all(downloads, manifest_path, workers=2)
+        return {path.name: status for path, status in statuses.items()}
+    
+    def no_partial_files():
+        return not list(output_dir.glob('*.part'))
+    
+    checks = []
+    try:
+        statuses = run(["logo.png", "photo.jpg"])
+        checks.append(("first run downloads every file",
+                       statuses == {"logo.png": "downloaded", "photo.jpg": "downloaded"}
+                       and (output_dir / "logo.png").read_bytes() == (served_dir / "logo.png").read_bytes()))
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        checks.append(("manifest records Last-Modified and size",
+                       manifest.get("logo.png", {}).get("last_modified") is not None
+                       and manifest["logo.png"]["size"] == 700))
+        
+        statuses = run(["logo.png", "photo.jpg"])
+        checks.append(("re-run skips unchanged files",
+                       statuses == {"logo.png": "unchanged", "photo.jpg": "unchanged"}))
+        checks.append(("re-run is answered with 304 Not Modified only",
+                       sorted(code for _, _, code in requests_log) == [304, 304]))
+        
+        (served_dir / "logo.png").write_bytes(b'logo v2' * 200)
+        mtime = (served_dir / "logo.png").stat().st_mtime + 60
+        os.utime(served_dir / "logo.png", (mtime, mtime))
+        statuses = run(["logo.png", "photo.jpg"])
+        checks.append(("changed file is downloaded again",
+                       statuses == {"logo.png": "downloaded", "photo.jpg": "unchanged"}
+                       and (output_dir / "logo.png").read_bytes() == b'logo v2' * 200))
+        
+        (served_dir / "photo.jpg").unlink()
+        (output_dir / "photo.jpg").write_bytes(b'stale')
+        statuses = run(["photo.jpg", "missing.png"])
+        checks.append(("404 is reported as failed", statuses == {"photo.jpg": "failed", "missing.png": "failed"}))
+        checks.append(("404 leaves no partial or empty files",
+                       no_partial_files() and not (output_dir / "missing.png").exists()))
+        checks.append(("404 keeps the previous download", (output_dir / "photo.jpg").read_bytes() == b'stale'))
+        
+        statuses = run(["truncated.png"])
+        checks.append(("truncated response is reported as failed", statuses == {"truncated.png": "failed"}))
+        checks.append(("truncated response leaves no partial file",
+                       no_partial_files() and not (output_dir / "truncated.png").exists()))
+        
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        checks.append(("manifest is valid JSON without failed downloads",
+                       "missing.png" not in manifest and "truncated.png" not in manifest
+                       and not manifest_path.with_name(manifest_path.name + '.part').exists()))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return checks
+
+def main():
+    """Main check function."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        checks = run_checks(Path(tmp_dir))
+    
+    for description, passed in checks:
+        print(f"{'✓' if passed else '✗'} {description}")
+    failed = sum(not passed for _, passed in checks)
+    print(f"\n{len(checks) - failed}/{len(checks)} checks passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
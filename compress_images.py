@@ -4,11 +4,393 @@ Compress images for web use while maintaining good quality.
 """
 
 import os
-from pathlib import Path
-from PIL import Image
+import io
+import re
+import base64
+import math
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from contextlib import nullcontext, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+from pathlib import Path, PurePosixPath
+from functools import lru_cache
+from PIL import Image, ImageChops, ImageStat
+import numpy as np
 import json
 
-def compress_image(input_path, output_path=None, quality=85, max_width=1920, max_height=1920):
+from instrumentation import (add_record, add_report_arguments, count, print_stage_summary, profile, stage, track_file,
+                             write_report)
+
+# Width ladder for responsive srcset variants
+VARIANT_WIDTHS = (320, 640, 1024, 1920)
+
+# Source images picked up by the batch functions
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.jpeg', '*.webp', '*.avif')
+
+# Encoder backends: Pillow format, output extension, and save options for a given quality
+ENCODERS = {
+    'jpeg': ('JPEG', '.jpg', lambda quality: {'quality': quality, 'optimize': True}),
+    'progressive-jpeg': ('JPEG', '.jpg', lambda quality: {'quality': quality, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', '.webp', lambda quality: {'quality': quality, 'method': 6}),
+    'avif': ('AVIF', '.avif', lambda quality: {'quality': quality, 'speed': 6}),
+    'png': ('PNG', '.png', lambda quality: {'optimize': True, 'compress_level': 9}),
+}
+
+# Encoders whose output does not depend on quality
+LOSSLESS_ENCODERS = {'png'}
+
+# Minimum PSNR (dB) a candidate encoding must reach to be chosen
+DEFAULT_MIN_PSNR = 35.0
+
+# Quality range searched when targeting an SSIM score
+SSIM_QUALITY_RANGE = (30, 95)
+
+# JPEG APPn markers kept when stripping metadata: APP0 (JFIF) and APP14 (Adobe colour transform)
+KEEP_JPEG_MARKERS = {0xE0, 0xEE}
+
+# Hex digits of the content hash embedded in published filenames
+HASH_LENGTH = 10
+HASHED_NAME = re.compile(rf'^.+\.[0-9a-f]{{{HASH_LENGTH}}}\.[A-Za-z0-9]+$')
+
+# Placeholder settings for the image metadata index
+BLURHASH_COMPONENTS = (4, 3)
+PLACEHOLDER_SIZE = 32
+LQIP_SIZE = 16
+BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+# Fast loading keeps Image.reduce output at least this multiple of the final size
+REDUCING_GAP = 2.0
+
+# Modes Image.reduce can average directly; others are converted to RGB first
+REDUCE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F'}
+
+# A PNG with more colours than this, no transparency and at least this much
+# neighbour-difference entropy (bits) is treated as a photo and goes straight to JPEG
+PHOTO_MIN_COLORS = 4096
+PHOTO_MIN_ENTROPY = 2.0
+PHOTO_SAMPLE_ROWS = 64
+
+def to_rgb(img):
+    """Convert an image to RGB, flattening transparency onto a white background."""
+    # Convert RGBA to RGB if needed (for JPEG compatibility)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Create white background for transparent images
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+        return background
+    elif img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def find_images(images_dir):
+    """List the images in a directory matching IMAGE_PATTERNS."""
+    return [path for pattern in IMAGE_PATTERNS for path in Path(images_dir).glob(pattern)]
+
+@lru_cache(maxsize=None)
+def available_encoders():
+    """Return the ENCODERS names the local Pillow build can actually write."""
+    names = []
+    probe = Image.new('RGB', (8, 8))
+    for name, (fmt, _, options) in ENCODERS.items():
+        try:
+            probe.save(io.BytesIO(), fmt, **options(85))
+        except (KeyError, OSError, ValueError):
+            continue
+        names.append(name)
+    return tuple(names)
+
+def encode_image(img, encoder, quality):
+    """Encode an RGB image in memory with the named encoder and return the bytes."""
+    fmt, _, options = ENCODERS[encoder]
+    buffer = io.BytesIO()
+    with stage('encode'):
+        img.save(buffer, fmt, **options(quality))
+    return buffer.getvalue()
+
+def atomic_write(path, data):
+    """
+    Write bytes to path through a temporary file and rename.
+    
+    The data goes to <name>.part, is flushed to disk, then replaces path in
+    one step, so a crash leaves either the old file or the new one, never a
+    truncated mix.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.part')
+    with stage('write'):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    count('bytes_out', len(data))
+
+def atomic_write_json(path, obj, **kwargs):
+    """Serialize obj with json.dumps(**kwargs) and write it with atomic_write."""
+    atomic_write(path, json.dumps(obj, **kwargs).encode('utf-8'))
+
+def uses_alpha(img):
+    """Check whether an image has any pixel that is not fully opaque."""
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        return img.getchannel('A').getextrema()[0] < 255
+    return img.mode == 'P' and 'transparency' in img.info
+
+def residual_entropy(img, rows=PHOTO_SAMPLE_ROWS):
+    """
+    Estimate the Shannon entropy (bits) of horizontal neighbour differences.
+    
+    Only about rows evenly spaced rows are sampled. Flat graphics and
+    screenshots score near 1 bit, camera photos 3-6 bits.
+    """
+    luma = np.asarray(img.convert('L'), dtype=np.int16)
+    residuals = np.diff(luma[::max(1, luma.shape[0] // rows)], axis=1).ravel()
+    if not residuals.size:
+        return 0.0
+    p = np.bincount(residuals + 255, minlength=511) / residuals.size
+    p = p[p > 0]
+    return float(-(p * np.log2(p)).sum())
+
+def looks_photographic(img, transparent=False):
+    """
+    Guess, without encoding, that JPEG will easily beat PNG for an RGB image.
+    
+    Transparent sources and images with few colours are never treated as
+    photos; the rest must also reach PHOTO_MIN_ENTROPY.
+    """
+    if transparent or img.getcolors(PHOTO_MIN_COLORS) is not None:
+        return False
+    return residual_entropy(img) >= PHOTO_MIN_ENTROPY
+
+def psnr(reference, candidate):
+    """Peak signal-to-noise ratio (dB) between two same-sized RGB images."""
+    diff = ImageChops.difference(reference, candidate)
+    mse = sum(rms ** 2 for rms in ImageStat.Stat(diff).rms) / len(diff.getbands())
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+def luma_array(img, max_side=512):
+    """Downscale an image to at most max_side pixels and return its luma as a float array."""
+    luma = img.convert('L')
+    if max(luma.size) > max_side:
+        luma.thumbnail((max_side, max_side), Image.Resampling.BOX)
+    return np.asarray(luma, dtype=np.float64)
+
+def _box_mean(a, size):
+    """Mean over every size x size window of a 2D array, via a summed-area table."""
+    table = np.pad(a, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    return (table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]) / (size * size)
+
+def ssim(x, y, window=7):
+    """Mean structural similarity of two same-shaped luma arrays (1.0 means identical)."""
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    window = min(window, *x.shape)
+    
+    mu_x = _box_mean(x, window)
+    mu_y = _box_mean(y, window)
+    var_x = _box_mean(x * x, window) - mu_x ** 2
+    var_y = _box_mean(y * y, window) - mu_y ** 2
+    cov_xy = _box_mean(x * y, window) - mu_x * mu_y
+    
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * cov_xy + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2))
+    return float(ssim_map.mean())
+
+def search_quality(img, encoder, target_ssim, reference=None, quality_range=SSIM_QUALITY_RANGE):
+    """
+    Binary-search the lowest encoder quality whose output reaches target_ssim.
+    
+    Scores are computed on downscaled luma (see luma_array). If even the top
+    of quality_range misses the target, that top quality is used.
+    
+    Returns:
+        Tuple of (quality, encoded bytes, SSIM score)
+    """
+    if reference is None:
+        reference = luma_array(img)
+    
+    best = None
+    low, high = quality_range
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode_image(img, encoder, quality)
+        with Image.open(io.BytesIO(data)) as decoded:
+            score = ssim(reference, luma_array(decoded))
+        if score >= target_ssim:
+            best = (quality, data, score)
+            high = quality - 1
+        else:
+            low = quality + 1
+    
+    if best is None:
+        quality = quality_range[1]
+        data = encode_image(img, encoder, quality)
+        with Image.open(io.BytesIO(data)) as decoded:
+            best = (quality, data, ssim(reference, luma_array(decoded)))
+    return best
+
+def choose_encoding(img, encoders, quality, min_psnr=DEFAULT_MIN_PSNR, target_ssim=None):
+    """
+    Encode an image with each encoder and pick the smallest acceptable result.
+    
+    With target_ssim, each lossy encoder's quality is searched to just reach
+    that SSIM; otherwise every encoder uses quality and is scored by PSNR
+    against min_psnr. If no candidate is acceptable, the most faithful one
+    is used instead.
+    
+    Returns:
+        Tuple of (chosen candidate, all candidates); each candidate is a dict
+        with encoder, quality (None for lossless), data and score
+    """
+    reference = luma_array(img) if target_ssim else None
+    threshold = target_ssim if target_ssim else min_psnr
+    
+    candidates = []
+    for encoder in encoders:
+        if encoder in LOSSLESS_ENCODERS:
+            candidate_quality = None
+            data = encode_image(img, encoder, quality)
+            score = 1.0 if target_ssim else math.inf
+        elif target_ssim:
+            candidate_quality, data, score = search_quality(img, encoder, target_ssim, reference)
+        else:
+            candidate_quality = quality
+            data = encode_image(img, encoder, quality)
+            with Image.open(io.BytesIO(data)) as decoded:
+                score = psnr(img, to_rgb(decoded))
+        candidates.append({"encoder": encoder, "quality": candidate_quality, "data": data, "score": score})
+    
+    acceptable = [c for c in candidates if c['score'] >= threshold]
+    if acceptable:
+        chosen = min(acceptable, key=lambda c: len(c['data']))
+    else:
+        chosen = max(candidates, key=lambda c: c['score'])
+    return chosen, candidates
+
+def fit_size(size, max_width, max_height):
+    """Size an image of the given size is scaled to by thumbnail((max_width, max_height))."""
+    width, height = size
+    scale = min(max_width / width, max_height / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def load_for_resize(img, max_width, max_height, fast_load=True):
+    """
+    Decode an opened image, skipping pixels the final resize would discard.
+    
+    With fast_load, JPEGs are decoded with DCT scaling (draft mode) and any
+    image is then box-reduced by an integer factor, both staying at least
+    REDUCING_GAP times the final size (as Image.thumbnail does), so the
+    LANCZOS resample afterwards still has spare resolution to work from.
+    Formats without draft support (e.g. PNG) only get the reduce step.
+    
+    Returns:
+        Tuple of (RGB image, description of the decode for logging)
+    """
+    target = fit_size(img.size, max_width, max_height)
+    start = time.perf_counter()
+    
+    scale = ""
+    if fast_load and target != img.size and img.format == 'JPEG':
+        img.draft(None, (int(target[0] * REDUCING_GAP), int(target[1] * REDUCING_GAP)))
+        if img.decoderconfig and img.decoderconfig[0] > 1:
+            scale = f" (1/{img.decoderconfig[0]} DCT scale)"
+    img.load()
+    
+    if fast_load and target != img.size:
+        factor = min(int(img.width / (target[0] * REDUCING_GAP)), int(img.height / (target[1] * REDUCING_GAP)))
+        if factor > 1:
+            # Palette, bilevel and 16-bit images cannot be box-averaged as they are
+            if img.mode not in REDUCE_MODES:
+                img = to_rgb(img)
+            img = img.reduce(factor)
+            scale += f" (reduced 1/{factor})"
+    
+    img = to_rgb(img)
+    return img, f"{img.width}x{img.height}{scale} in {(time.perf_counter() - start) * 1000:.0f} ms"
+
+def strip_jpeg_metadata(data):
+    """
+    Drop metadata segments (EXIF, XMP, ICC, comments) from JPEG bytes without decoding.
+    
+    Segments before the first scan are copied unless they are COM or an APPn
+    marker outside KEEP_JPEG_MARKERS; the entropy-coded data is untouched.
+    """
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("not a JPEG file")
+    
+    parts = [data[:2]]
+    pos = 2
+    while pos < len(data):
+        if data[pos] != 0xFF:
+            raise ValueError(f"corrupt JPEG marker at byte {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in (0xDA, 0xD9):
+            # Start of scan / end of image: copy the rest verbatim
+            parts.append(data[pos:])
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers without a length
+            parts.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        is_metadata = marker == 0xFE or (0xE0 <= marker <= 0xEF and marker not in KEEP_JPEG_MARKERS)
+        if not is_metadata:
+            parts.append(data[pos:end])
+        pos = end
+    return b''.join(parts)
+
+def optimize_jpeg_lossless(data):
+    """
+    Losslessly shrink JPEG bytes, keeping the DCT coefficients untouched.
+    
+    Uses jpegtran (libjpeg-turbo) when it is on PATH to strip metadata,
+    rebuild optimal Huffman tables and convert to progressive; otherwise
+    falls back to stripping metadata only.
+    
+    Returns:
+        Tuple of (optimized bytes, method used)
+    """
+    jpegtran = shutil.which('jpegtran')
+    if jpegtran:
+        result = subprocess.run([jpegtran, '-copy', 'none', '-optimize', '-progressive'],
+                                input=data, capture_output=True, check=True)
+        return result.stdout, 'jpegtran'
+    return strip_jpeg_metadata(data), 'metadata strip'
+
+def _save_lossless_jpeg(img, input_path, output_path, data, quality, compare_reencode):
+    """Write a JPEG that needs no resize without re-encoding it; returns the path written."""
+    if data is None:
+        with stage('read'), open(input_path, 'rb') as f:
+            data = f.read()
+    
+    with stage('lossless'):
+        optimized, method = optimize_jpeg_lossless(data)
+    if len(optimized) >= len(data):
+        optimized = data
+    
+    report = f"  Lossless ({method}): {(len(data) - len(optimized)) / 1024:.1f} KB saved"
+    if compare_reencode:
+        reencoded_size = len(encode_image(load_for_resize(img, *img.size)[0], 'jpeg', quality))
+        report += (f"; re-encoding at q{quality} would be {reencoded_size / 1024:.1f} KB "
+                   f"({(reencoded_size - len(optimized)) / 1024:+.1f} KB)")
+    print(report)
+    
+    atomic_write(output_path, optimized)
+    return Path(output_path)
+
+def compress_image(input_path, output_path=None, quality=85, max_width=1920, max_height=1920,
+                   formats=None, min_psnr=DEFAULT_MIN_PSNR, target_ssim=None, data=None, fast_load=True,
+                   lossless_jpeg=False, compare_reencode=False, keep_source=False):
     """
     Compress an image for web use.
     
@@ -18,154 +400,828 @@ def compress_image(input_path, output_path=None, quality=85, max_width=1920, max
         quality: JPEG/PNG quality (1-100, higher is better)
         max_width: Maximum width in pixels
         max_height: Maximum height in pixels
+        formats: Optional list of ENCODERS names to choose from; the smallest
+            output above min_psnr wins and its extension replaces the original.
+            Encoders not supported by the local Pillow build are ignored.
+        min_psnr: Quality floor (dB) for format selection
+        target_ssim: Optional SSIM target (e.g. 0.99); the encoder quality is
+            binary-searched per image instead of using the fixed quality.
+            Without formats, JPEG sources stay JPEG and others pick PNG or JPEG.
+        data: Optional encoded image bytes to compress instead of reading
+            input_path, which then only supplies the name and source format
+        fast_load: Decode large images at reduced size (see load_for_resize)
+        lossless_jpeg: Optimize JPEGs that need no resize losslessly (see
+            optimize_jpeg_lossless) instead of re-encoding them at quality
+        compare_reencode: With lossless_jpeg, also encode at quality in memory
+            and report how many bytes the lossless path saved against it
+        keep_source: When the compressed image replaces input_path under a new
+            extension, leave input_path for the caller to remove (see
+            record_compressed) instead of deleting it here
     """
     if output_path is None:
         output_path = input_path
     
     try:
-        with Image.open(input_path) as img:
-            # Convert RGBA to RGB if needed (for JPEG compatibility)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Create white background for transparent images
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize if image is too large
+        with track_file('compress', Path(input_path).name), \
+                Image.open(input_path if data is None else io.BytesIO(data)) as img:
+            count('bytes_in', os.path.getsize(input_path) if data is None else len(data))
             original_size = img.size
-            if img.width > max_width or img.height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-                print(f"  Resized: {original_size} -> {img.size}")
+            if (lossless_jpeg and not formats and not target_ssim and img.format == 'JPEG'
+                    and img.mode in ('RGB', 'L') and fit_size(img.size, max_width, max_height) == img.size):
+                return _save_lossless_jpeg(img, input_path, output_path, data, quality, compare_reencode)
             
             # Get file extension
             ext = Path(input_path).suffix.lower()
+            transparent = ext == '.png' and uses_alpha(img)
+            
+            with stage('decode'):
+                img, decode_info = load_for_resize(img, max_width, max_height, fast_load)
+            
+            # Resize if image is too large
+            if img.width > max_width or img.height > max_height:
+                with stage('resize'):
+                    img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+                print(f"  Resized: {original_size} -> {img.size} (decoded at {decode_info})")
+            
+            if target_ssim and not formats:
+                formats = ['jpeg'] if ext in ('.jpg', '.jpeg') else ['png', 'jpeg']
+            if formats:
+                return _save_best_encoding(img, input_path, output_path, formats, quality, min_psnr, target_ssim,
+                                           remove_input=data is None and not keep_source)
             
             # Save with optimization
             if ext in ('.jpg', '.jpeg'):
-                img.save(output_path, 'JPEG', quality=quality, optimize=True)
+                atomic_write(output_path, encode_image(img, 'jpeg', quality))
             elif ext == '.png':
                 # For PNG, use optimize flag and convert to JPEG if significantly larger
-                # Save as PNG first
-                img.save(output_path, 'PNG', optimize=True, compress_level=9)
-                
-                # Check if converting to JPEG would be better
-                png_size = os.path.getsize(output_path)
-                jpeg_path = output_path.with_suffix('.jpg')
-                img.save(jpeg_path, 'JPEG', quality=quality, optimize=True)
-                jpeg_size = os.path.getsize(jpeg_path)
+                # Encode in memory so only the winner is ever written; photos skip the slow PNG encode
+                jpeg_data = encode_image(img, 'jpeg', quality)
+                with stage('analyze'):
+                    photographic = looks_photographic(img, transparent)
+                png_data = None if photographic else encode_image(img, 'png', quality)
+                if photographic:
+                    print("  Photographic PNG: skipped PNG encode")
                 
                 # If JPEG is significantly smaller (more than 30% reduction), use it
-                if jpeg_size < png_size * 0.7:
-                    os.remove(output_path)
+                if photographic or len(jpeg_data) < len(png_data) * 0.7:
+                    jpeg_path = Path(output_path).with_suffix('.jpg')
+                    atomic_write(jpeg_path, jpeg_data)
+                    # Only drop the original once its replacement is safely on disk
+                    if data is None and not keep_source and Path(output_path) == Path(input_path):
+                        os.remove(input_path)
                     return jpeg_path
-                else:
-                    os.remove(jpeg_path)
+                atomic_write(output_path, png_data)
             else:
-                # For other formats, save as JPEG
-                output_path = output_path.with_suffix('.jpg')
-                img.save(output_path, 'JPEG', quality=quality, optimize=True)
+                # For other formats (WebP, AVIF, ...), save as JPEG
+                jpeg_path = Path(output_path).with_suffix('.jpg')
+                atomic_write(jpeg_path, encode_image(img, 'jpeg', quality))
+                # Replacing the input in place: drop the original so it is not picked up again
+                if data is None and not keep_source and Path(output_path) == Path(input_path):
+                    os.remove(input_path)
+                output_path = jpeg_path
             
             return output_path
-            
+    
     except Exception as e:
         print(f"  Error compressing {input_path}: {e}")
         return None
 
-def compress_all_images(images_dir, quality=85, max_dimension=1920):
-    """Compress all images in a directory."""
-    images_dir = Path(images_dir)
+def _save_best_encoding(img, input_path, output_path, formats, quality, min_psnr, target_ssim=None,
+                        remove_input=True):
+    """Write img using the best of formats; returns the path written."""
+    encoders = [name for name in formats if name in available_encoders()]
+    if not encoders:
+        raise ValueError(f"none of the requested formats are supported: {', '.join(formats)}")
     
-    if not images_dir.exists():
-        print(f"Error: Directory {images_dir} does not exist")
-        return
+    chosen, candidates = choose_encoding(img, encoders, quality, min_psnr, target_ssim)
+    encoder, data = chosen['encoder'], chosen['data']
+    metric = "SSIM {:.4f}" if target_ssim else "{:.1f} dB"
+    if len(candidates) > 1:
+        print("  Formats: " + ", ".join(
+            f"{c['encoder']}{'' if c['quality'] is None else ' q' + str(c['quality'])} "
+            f"{len(c['data']) / 1024:.1f} KB @ {metric.format(c['score'])}" for c in candidates) + f" -> {encoder}")
+    if target_ssim and chosen['quality'] is not None:
+        baseline_size = len(encode_image(img, encoder, quality))
+        print(f"  Quality: {encoder} q{chosen['quality']} ({metric.format(chosen['score'])}), "
+              f"{(baseline_size - len(data)) / 1024:.1f} KB saved vs q{quality}")
     
-    image_files = list(images_dir.glob('*.png')) + list(images_dir.glob('*.jpg')) + list(images_dir.glob('*.jpeg'))
+    final_path = Path(output_path).with_suffix(ENCODERS[encoder][1])
+    atomic_write(final_path, data)
     
-    if not image_files:
-        print("No images found to compress")
-        return
+    # Replacing the input in place under a new extension: drop the original
+    if remove_input and Path(output_path) == Path(input_path) and final_path != Path(input_path):
+        os.remove(input_path)
+    return final_path
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with stage('hash'), open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_cache(cache_path):
+    """Load the compression cache manifest, or an empty one if missing/corrupt."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache_path, cache):
+    """Write the compression cache manifest atomically."""
+    atomic_write_json(cache_path, cache, indent=2, sort_keys=True)
+
+def replay_journal(journal_path, cache, renamed_files):
+    """
+    Apply the records of an interrupted run's journal to cache and renamed_files.
     
-    print(f"Found {len(image_files)} images to compress...")
-    print(f"Settings: Quality={quality}, Max dimension={max_dimension}px\n")
+    A torn final line (the run died mid-append) is ignored.
     
-    total_original_size = 0
-    total_compressed_size = 0
-    compressed_count = 0
-    renamed_files = {}  # Track any file renames (PNG -> JPG)
+    Returns:
+        Number of records replayed
+    """
+    replayed = 0
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                _apply_record(record, cache, renamed_files)
+                replayed += 1
+    except OSError:
+        pass
+    return replayed
+
+def _apply_record(record, cache, renamed_files):
+    """Apply one compressed-image record to the cache and the renamed-files map."""
+    source, name = record['source'], record['name']
     
-    for img_path in image_files:
-        original_size = os.path.getsize(img_path)
-        total_original_size += original_size
-        
+    # Track if filename changed (PNG -> JPG, or a new format)
+    if name != source:
+        # Keep earlier renames pointing at the newest file (a.png -> a.jpg -> a.webp)
+        for old, new in renamed_files.items():
+            if new == source:
+                renamed_files[old] = name
+        renamed_files[source] = name
+        cache.pop(source, None)
+    cache[name] = record['entry']
+
+def is_cached(entry, img_path, settings):
+    """
+    Check whether an image is already the compressed output recorded in the cache.
+    
+    A matching size and mtime is trusted without reading the file; otherwise
+    the file is re-hashed and compared against the recorded output hash (and
+    the entry's mtime refreshed on a match). A file that no longer exists
+    (e.g. the images were wiped for a fresh extraction) is not cached.
+    """
+    if not entry or entry.get('settings') != settings:
+        return False
+    
+    try:
+        stat = img_path.stat()
+    except FileNotFoundError:
+        return False
+    if entry['size'] != stat.st_size:
+        return False
+    if entry['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    
+    if file_sha256(img_path) == entry['output_sha256']:
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+    return False
+
+def compression_settings(quality=85, max_dimension=1920, formats=None, min_psnr=DEFAULT_MIN_PSNR, target_ssim=None,
+                         fast_load=True, lossless_jpeg=False):
+    """Build the settings dict passed to workers and recorded in the cache."""
+    settings = {"quality": quality, "max_dimension": max_dimension}
+    if not fast_load:
+        settings["fast_load"] = False
+    if lossless_jpeg:
+        settings["lossless_jpeg"] = True
+    if formats:
+        settings.update({"formats": list(formats), "min_psnr": min_psnr})
+    if target_ssim:
+        settings["target_ssim"] = target_ssim
+    return settings
+
+def _compress_one(img_path, settings, data=None):
+    """
+    Compress a single image and capture its log output.
+    
+    Output is buffered so that results from worker processes can be printed
+    whole, without interleaving. With data, the image is compressed from
+    those bytes and written to img_path; nothing is read from disk, and if
+    compression fails the original bytes are written to img_path instead.
+    
+    Returns:
+        Dict with the source path, sizes, hashes, output path, log text and
+        the instrumentation record of the file
+    """
+    log = io.StringIO()
+    with redirect_stdout(log), track_file('compress', img_path.name) as metrics:
+        if data is None:
+            source_sha256 = file_sha256(img_path)
+            original_size = os.path.getsize(img_path)
+        else:
+            with stage('hash'):
+                source_sha256 = hashlib.sha256(data).hexdigest()
+            original_size = len(data)
         print(f"Compressing: {img_path.name} ({original_size / 1024:.1f} KB)", end=" -> ")
         
-        compressed_path = compress_image(img_path, quality=quality, max_width=max_dimension, max_height=max_dimension)
+        compressed_path = compress_image(img_path, quality=settings['quality'],
+                                         max_width=settings['max_dimension'], max_height=settings['max_dimension'],
+                                         formats=settings.get('formats'),
+                                         min_psnr=settings.get('min_psnr', DEFAULT_MIN_PSNR),
+                                         target_ssim=settings.get('target_ssim'), data=data,
+                                         fast_load=settings.get('fast_load', True),
+                                         lossless_jpeg=settings.get('lossless_jpeg', False),
+                                         compare_reencode=settings.get('compare_reencode', False),
+                                         keep_source=settings.get('keep_source', False))
         
+        compressed_size = None
+        output_sha256 = None
         if compressed_path and compressed_path.exists():
             compressed_size = os.path.getsize(compressed_path)
-            total_compressed_size += compressed_size
-            compressed_count += 1
-            
+            output_sha256 = file_sha256(compressed_path)
             reduction = ((original_size - compressed_size) / original_size) * 100
             print(f"{compressed_path.name} ({compressed_size / 1024:.1f} KB, {reduction:.1f}% reduction)")
-            
-            # Track if filename changed (PNG -> JPG)
-            if compressed_path.name != img_path.name:
-                renamed_files[img_path.name] = compressed_path.name
+        elif data is not None:
+            # Nothing is on disk yet: keep the original so references to img_path stay valid
+            atomic_write(img_path, data)
+            print("FAILED (original kept)")
         else:
             print("FAILED")
     
+    return {
+        "path": img_path,
+        "original_size": original_size,
+        "compressed_path": compressed_path,
+        "compressed_size": compressed_size,
+        "source_sha256": source_sha256,
+        "output_sha256": output_sha256,
+        "log": log.getvalue(),
+        "metrics": metrics,
+    }
+
+def record_compressed(result, settings, cache, renamed_files, journal=None):
+    """
+    Record a successful _compress_one result in the cache and the renamed-files map.
+    
+    With journal (a file opened for appending), the record is also written
+    and fsynced there first, so an interrupted batch can be resumed with
+    replay_journal. A source left on disk under its old name (see
+    compress_image's keep_source) is removed only after that, so a rename is
+    never lost to a crash.
+    """
+    compressed_path = result['compressed_path']
+    stat = compressed_path.stat()
+    record = {
+        "source": result['path'].name,
+        "name": compressed_path.name,
+        "entry": {
+            "source_sha256": result['source_sha256'],
+            "output_sha256": result['output_sha256'],
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "settings": settings,
+        },
+    }
+    if journal:
+        journal.write(json.dumps(record) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+    _apply_record(record, cache, renamed_files)
+    if compressed_path != result['path'] and result['path'].exists():
+        os.remove(result['path'])
+
+def print_summary(compressed_count, attempted_count, skipped_count, total_original_size, total_compressed_size):
+    """Print the end-of-run compression summary."""
     print(f"\n{'='*60}")
     print(f"Compression Summary:")
-    print(f"  Images processed: {compressed_count}/{len(image_files)}")
-    print(f"  Original total size: {total_original_size / (1024*1024):.2f} MB")
-    print(f"  Compressed total size: {total_compressed_size / (1024*1024):.2f} MB")
-    print(f"  Total reduction: {((total_original_size - total_compressed_size) / total_original_size) * 100:.1f}%")
-    print(f"  Space saved: {(total_original_size - total_compressed_size) / (1024*1024):.2f} MB")
+    print(f"  Images processed: {compressed_count}/{attempted_count}")
+    if skipped_count:
+        print(f"  Images skipped (unchanged): {skipped_count}")
+    if total_original_size:
+        print(f"  Original total size: {total_original_size / (1024*1024):.2f} MB")
+        print(f"  Compressed total size: {total_compressed_size / (1024*1024):.2f} MB")
+        print(f"  Total reduction: {((total_original_size - total_compressed_size) / total_original_size) * 100:.1f}%")
+        print(f"  Space saved: {(total_original_size - total_compressed_size) / (1024*1024):.2f} MB")
+
+def map_in_pool(func, items, settings, workers, ordered=True):
+    """
+    Yield func(item, settings) for each item, using a process pool unless workers == 1.
     
-    return renamed_files
+    Shared by the batch scripts; func must be a picklable module-level
+    function, and workers=None uses all CPU cores. Results come in input
+    order, or with ordered=False as soon as each finishes, so a caller
+    recording progress never lags behind work already done.
+    """
+    if workers == 1:
+        for item in items:
+            yield func(item, settings)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+            yield from executor.map(func, items, repeat(settings))
+        else:
+            futures = [executor.submit(func, item, settings) for item in items]
+            for future in as_completed(futures):
+                yield future.result()
 
-def update_json_paths(json_path, renamed_files):
-    """Update JSON file if any images were renamed (PNG -> JPG)."""
-    if not renamed_files:
+def _split_by_stem(image_files):
+    """
+    Split images into batches in which no two share a stem.
+    
+    A crash between writing a.jpg for a.png and journaling it leaves both on
+    disk; the older file (the source) goes in the first batch, so its output
+    is not compressed concurrently with the source that rewrites it.
+    """
+    batches = []
+    for img_path in sorted(image_files, key=lambda p: p.stat().st_mtime_ns):
+        for batch in batches:
+            if img_path.stem not in batch:
+                batch[img_path.stem] = img_path
+                break
+        else:
+            batches.append({img_path.stem: img_path})
+    return [list(batch.values()) for batch in batches]
+
+def compress_all_images(images_dir, quality=85, max_dimension=1920, workers=1, cache_path=None,
+                        formats=None, min_psnr=DEFAULT_MIN_PSNR, target_ssim=None, fast_load=True,
+                        lossless_jpeg=False, compare_reencode=False, journal_path=None):
+    """
+    Compress all images in a directory.
+    
+    Args:
+        images_dir: Directory containing the images
+        quality: JPEG/PNG quality (1-100, higher is better)
+        max_dimension: Maximum width/height in pixels
+        workers: Number of worker processes (1 runs in-process, None uses all CPU cores)
+        cache_path: Optional manifest of already-compressed images; unchanged
+            images compressed with the same settings are skipped
+        formats: Optional list of ENCODERS names; each image is written in
+            whichever is smallest while staying above min_psnr
+        min_psnr: Quality floor (dB) for format selection
+        target_ssim: Optional SSIM target; quality is searched per image
+        fast_load: Decode large images at reduced size before resizing
+        lossless_jpeg: Optimize JPEGs that need no resize without re-encoding
+        compare_reencode: Report lossless savings against a q=quality re-encode
+        journal_path: Optional append-only log of finished images. A journal
+            left by an interrupted run is replayed first so its images are
+            not compressed again and its renames are returned; the caller
+            deletes the journal once the renames are committed
+    
+    Returns:
+        Dict mapping old image filenames to new ones
+    """
+    images_dir = Path(images_dir)
+    
+    if not images_dir.exists():
+        print(f"Error: Directory {images_dir} does not exist")
         return
     
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    settings = compression_settings(quality, max_dimension, formats, min_psnr, target_ssim, fast_load, lossless_jpeg)
+    cache = load_cache(cache_path) if cache_path else {}
+    renamed_files = {}  # Track any file renames (PNG -> JPG)
+    resumed_count = replay_journal(journal_path, cache, renamed_files) if journal_path else 0
+    
+    # Temporary files from writes cut short by a crash
+    for tmp_path in images_dir.glob('*.part'):
+        tmp_path.unlink()
+    # Sources whose rename was journaled just before a crash, but not yet removed
+    for old, new in renamed_files.items():
+        if (images_dir / old).exists() and is_cached(cache.get(new), images_dir / new, settings):
+            os.remove(images_dir / old)
+    
+    image_files = find_images(images_dir)
+    
+    if not image_files:
+        print("No images found to compress")
+        return renamed_files
+    
+    pending = [p for p in image_files if not is_cached(cache.get(p.name), p, settings)]
+    # Not part of the cache key: a reporting option, and sources are removed here once journaled
+    worker_settings = dict(settings, compare_reencode=compare_reencode, keep_source=True)
+    skipped_count = len(image_files) - len(pending)
+    
+    print(f"Found {len(image_files)} images to compress...")
+    if resumed_count:
+        print(f"Resuming interrupted run: {resumed_count} images already compressed (from {journal_path})")
+    if skipped_count:
+        print(f"Skipping {skipped_count} unchanged images (already compressed with these settings)")
+    print(f"Settings: Quality={quality}, Max dimension={max_dimension}px, Workers={workers or os.cpu_count()}")
+    if formats:
+        print(f"Formats: {', '.join(formats)} (available: {', '.join(available_encoders())}), Min PSNR={min_psnr} dB")
+    if target_ssim:
+        print(f"Target SSIM: {target_ssim} (quality searched in {SSIM_QUALITY_RANGE[0]}-{SSIM_QUALITY_RANGE[1]})")
+    if lossless_jpeg:
+        print(f"Lossless JPEG: {'jpegtran' if shutil.which('jpegtran') else 'metadata strip (jpegtran not found)'}")
+    print()
+    
+    total_original_size = 0
+    total_compressed_size = 0
+    compressed_count = 0
+    attempted_count = 0
+    
+    with open(journal_path, 'a', encoding='utf-8') if journal_path else nullcontext() as journal:
+        for batch in _split_by_stem(pending):
+            # Outputs written by an earlier batch (a.jpg for a.png) are cached by now
+            batch = [p for p in batch if p.exists() and not is_cached(cache.get(p.name), p, settings)]
+            attempted_count += len(batch)
+            # Journal each image as soon as it is written, not when its turn in input order comes
+            for result in map_in_pool(_compress_one, batch, worker_settings, workers, ordered=False):
+                add_record(result['metrics'])
+                total_original_size += result['original_size']
+                print(result['log'], end="")
+                
+                if result['compressed_size'] is None:
+                    continue
+                
+                total_compressed_size += result['compressed_size']
+                compressed_count += 1
+                record_compressed(result, settings, cache, renamed_files, journal)
+    
+    if cache_path:
+        save_cache(cache_path, cache)
+    
+    print_summary(compressed_count, attempted_count, skipped_count, total_original_size, total_compressed_size)
+    
+    return renamed_files
+
+def generate_variants(input_path, variants_dir, widths=VARIANT_WIDTHS, quality=85):
+    """
+    Generate a ladder of resized JPEG variants from a single decode.
+    
+    The source is decoded once and each smaller width is resized from the
+    previous (larger) variant rather than from the full-size image. Widths
+    larger than the source are capped to the source width, never upscaled.
+    
+    Args:
+        input_path: Path to input image
+        variants_dir: Directory to write variants to (as <stem>_<width>w.jpg)
+        widths: Target widths in pixels
+        quality: JPEG quality (1-100, higher is better)
+    
+    Returns:
+        List of dicts with path, width, height and size, largest first
+    """
+    input_path = Path(input_path)
+    variants_dir = Path(variants_dir)
+    variants = []
+    
+    with Image.open(input_path) as img:
+        current = to_rgb(img)
+        for width in sorted({min(w, current.width) for w in widths}, reverse=True):
+            if width < current.width:
+                height = max(1, round(current.height * width / current.width))
+                current = current.resize((width, height), Image.Resampling.LANCZOS)
+            
+            variant_path = variants_dir / f"{input_path.stem}_{width}w.jpg"
+            current.save(variant_path, 'JPEG', quality=quality, optimize=True)
+            variants.append({
+                "path": variant_path,
+                "width": current.width,
+                "height": current.height,
+                "size": os.path.getsize(variant_path),
+            })
+    
+    return variants
+
+def _variants_one(img_path, settings):
+    """Generate variants for a single image, returning (img_path, variants, log)."""
+    log = io.StringIO()
+    with redirect_stdout(log):
+        try:
+            variants = generate_variants(img_path, settings['variants_dir'], settings['widths'], settings['quality'])
+            print(f"Variants: {img_path.name} -> " + ", ".join(f"{v['width']}w ({v['size'] / 1024:.1f} KB)" for v in variants))
+        except Exception as e:
+            variants = None
+            print(f"  Error generating variants for {img_path}: {e}")
+    return img_path, variants, log.getvalue()
+
+def generate_all_variants(images_dir, variants_dir, manifest_path, widths=VARIANT_WIDTHS, quality=85, workers=1):
+    """
+    Generate responsive variants for all images and write a srcset manifest.
+    
+    The manifest maps each image filename to its variants (paths relative to
+    the manifest's directory) plus a ready-to-use srcset string.
     
+    Args:
+        images_dir: Directory containing the (compressed) images
+        variants_dir: Directory to write variants to
+        manifest_path: Path of the JSON manifest to write
+        widths: Target widths in pixels
+        quality: JPEG quality (1-100, higher is better)
+        workers: Number of worker processes (1 runs in-process, None uses all CPU cores)
+    """
+    images_dir = Path(images_dir)
+    variants_dir = Path(variants_dir)
+    manifest_path = Path(manifest_path)
+    variants_dir.mkdir(parents=True, exist_ok=True)
+    
+    image_files = sorted(find_images(images_dir))
+    print(f"\nGenerating variants ({', '.join(f'{w}w' for w in widths)}) for {len(image_files)} images...")
+    
+    settings = {"variants_dir": str(variants_dir), "widths": list(widths), "quality": quality}
+    manifest = {}
+    for img_path, variants, log in map_in_pool(_variants_one, image_files, settings, workers):
+        print(log, end="")
+        if not variants:
+            continue
+        
+        entries = []
+        for variant in variants:
+            rel_path = Path(os.path.relpath(variant['path'], manifest_path.parent)).as_posix()
+            entries.append({"path": rel_path, "width": variant['width'], "height": variant['height'], "size": variant['size']})
+        manifest[img_path.name] = {
+            "variants": entries,
+            "srcset": ", ".join(f"{e['path']} {e['width']}w" for e in reversed(entries)),
+        }
+    
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"Variant manifest saved to: {manifest_path}")
+    
+    return manifest
+
+def _base83(value, length):
+    """Encode an integer as a fixed-length base83 string (BlurHash alphabet)."""
+    return "".join(BASE83_CHARS[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+def _linear_to_srgb(value):
+    """Convert a linear-light channel value (0-1) to an 8-bit sRGB integer."""
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def blurhash(pixels, components=BLURHASH_COMPONENTS):
+    """
+    Compute the BlurHash of an RGB uint8 array (height x width x 3).
+    
+    All DCT-style components are computed at once with matrix products
+    over the linearised pixels.
+    """
+    components_x, components_y = components
+    height, width, _ = pixels.shape
+    
+    srgb = pixels.astype(np.float64) / 255
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    
+    basis_x = np.cos(np.pi * np.outer(np.arange(components_x), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(components_y), np.arange(height)) / height)
+    factors = np.einsum('jy,ix,yxc->jic', basis_y, basis_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+    
+    dc, ac = factors[0], factors[1:]
+    result = _base83((components_x - 1) + (components_y - 1) * 9, 1)
+    
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1
+    result += _base83(quantised_max, 1)
+    
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+    
+    scaled = np.sign(ac) * np.abs(ac / maximum) ** 0.5
+    quantised = np.clip(np.floor(scaled * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _base83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return result
+
+def dominant_color(pixels, bits=4):
+    """Most common colour of an RGB uint8 array, bucketed to bits per channel, as #rrggbb."""
+    flat = pixels.reshape(-1, 3)
+    quantised = (flat >> (8 - bits)).astype(np.int64)
+    buckets = (quantised[:, 0] << (2 * bits)) | (quantised[:, 1] << bits) | quantised[:, 2]
+    top = np.bincount(buckets).argmax()
+    r, g, b = flat[buckets == top].mean(axis=0).round().astype(int)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def image_metadata(img_path):
+    """
+    Compute layout and placeholder metadata for one image.
+    
+    The image is decoded once at reduced size (JPEG draft mode, then a
+    PLACEHOLDER_SIZE thumbnail) and that small pixel array feeds both the
+    dominant colour and the BlurHash. A LQIP_SIZE JPEG data URI is included
+    for sites that want a placeholder without a BlurHash decoder.
+    """
+    with Image.open(img_path) as img:
+        width, height = img.size
+        img.draft('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        small = to_rgb(img)
+        small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    
+    pixels = np.asarray(small)
+    lqip = small.copy()
+    lqip.thumbnail((LQIP_SIZE, LQIP_SIZE), Image.Resampling.BOX)
+    lqip_data = encode_image(lqip, 'jpeg', 60)
+    
+    return {
+        "width": width,
+        "height": height,
+        "aspect_ratio": round(width / height, 4),
+        "dominant_color": dominant_color(pixels),
+        "blurhash": blurhash(pixels),
+        "lqip": "data:image/jpeg;base64," + base64.b64encode(lqip_data).decode('ascii'),
+    }
+
+def _metadata_one(img_path, settings):
+    """Compute image_metadata for a worker, returning (img_path, metadata, log)."""
+    try:
+        return img_path, image_metadata(img_path), ""
+    except Exception as e:
+        return img_path, None, f"  Error indexing {img_path}: {e}\n"
+
+def build_image_index(images_dir, index_path, workers=1):
+    """
+    Write a sidecar index of dimensions and placeholders for every image.
+    
+    The index maps each image filename to its width, height, aspect ratio,
+    dominant colour, BlurHash and LQIP data URI, so pages can reserve space
+    and paint a placeholder before the image itself loads.
+    """
+    image_files = sorted(find_images(images_dir))
+    print(f"\nIndexing {len(image_files)} images...")
+    
+    index = {}
+    for img_path, metadata, log in map_in_pool(_metadata_one, image_files, {}, workers):
+        print(log, end="")
+        if metadata:
+            index[img_path.name] = metadata
+    
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    print(f"Image index saved to: {index_path}")
+    return index
+
+def rename_images(slides_data, renamed_files):
+    """Apply renamed_files to the image entries of slides data in place; returns True if any changed."""
     updated = False
-    for slide in data:
+    for slide in slides_data:
         for img in slide.get('images', []):
             old_filename = img['filename']
             if old_filename in renamed_files:
                 new_filename = renamed_files[old_filename]
                 img['filename'] = new_filename
                 # Update path
-                old_path = img['path']
-                img['path'] = old_path.rsplit('.', 1)[0] + '.' + new_filename.split('.')[-1]
+                img['path'] = PurePosixPath(img['path']).with_name(new_filename).as_posix()
                 updated = True
+    return updated
+
+def update_json_paths(json_path, renamed_files):
+    """
+    Update JSON file if any images were renamed (PNG -> JPG, JPG -> WebP, ...).
     
-    if updated:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    Every image entry whose filename is a key of renamed_files gets the new
+    filename, and the last component of its path is replaced to match.
+    """
+    if not renamed_files:
+        return
+    
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    if rename_images(data, renamed_files):
+        atomic_write_json(json_path, data, indent=2, ensure_ascii=False)
         print(f"\nUpdated {json_path} with new image filenames")
 
+def publish_hashed_images(images_dir, publish_dir, manifest_name="manifest.json"):
+    """
+    Publish images under content-hashed names for long-lived HTTP caching.
+    
+    Each image is copied to publish_dir as <stem>.<hash><ext>, where hash is
+    the first HASH_LENGTH hex digits of its SHA-256, so a URL only ever
+    serves one version of a file and can be cached as immutable. A manifest
+    maps each logical filename to its hashed path (relative to publish_dir),
+    size, dimensions and full hash. Hashed files no longer referenced by the
+    manifest are deleted.
+    
+    Returns:
+        The manifest dict
+    """
+    publish_dir = Path(publish_dir)
+    publish_dir.mkdir(parents=True, exist_ok=True)
+    
+    manifest = {}
+    added_count = 0
+    for img_path in sorted(find_images(images_dir)):
+        digest = file_sha256(img_path)
+        hashed_name = f"{img_path.stem}.{digest[:HASH_LENGTH]}{img_path.suffix.lower()}"
+        hashed_path = publish_dir / hashed_name
+        if not hashed_path.exists():
+            # Never leave a truncated file under a name that is only checked for existence
+            atomic_write(hashed_path, img_path.read_bytes())
+            added_count += 1
+        
+        with Image.open(img_path) as img:
+            width, height = img.size
+        manifest[img_path.name] = {
+            "path": hashed_name,
+            "size": os.path.getsize(img_path),
+            "width": width,
+            "height": height,
+            "sha256": digest,
+        }
+    
+    # Switch to the new manifest before deleting anything the old one may still reference
+    manifest_path = publish_dir / manifest_name
+    atomic_write_json(manifest_path, manifest, indent=2, sort_keys=True, ensure_ascii=False)
+    
+    # Garbage-collect hashed files from earlier builds
+    live = {entry['path'] for entry in manifest.values()}
+    removed_count = 0
+    for path in publish_dir.iterdir():
+        if path.is_file() and HASHED_NAME.match(path.name) and path.name not in live:
+            path.unlink()
+            removed_count += 1
+    
+    print(f"\nPublished {len(manifest)} images to {publish_dir} "
+          f"({added_count} new, {removed_count} stale removed); manifest: {manifest_path}")
+    return manifest
+
 def main():
     """Main compression function."""
     script_dir = Path(__file__).parent
     images_dir = script_dir / "extracted_content" / "images"
     json_path = script_dir / "extracted_content" / "slides_data.json"
+    cache_path = script_dir / "extracted_content" / "compression_cache.json"
+    journal_path = script_dir / "extracted_content" / "compression_journal.jsonl"
+    variants_dir = images_dir / "variants"
+    variants_manifest_path = script_dir / "extracted_content" / "variants.json"
+    index_path = script_dir / "extracted_content" / "image_index.json"
+    
+    parser = argparse.ArgumentParser(description="Compress extracted images for web use.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: all CPU cores, 1 disables the pool)")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompress every image, ignoring the compression cache "
+                             "(an interrupted run's journal is still resumed)")
+    parser.add_argument("--formats", type=lambda value: value.split(','), default=None,
+                        help=f"Comma-separated encoders to choose from per image ({', '.join(ENCODERS)}); "
+                             "default keeps the original JPEG/PNG behaviour")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help=f"Quality floor in dB for --formats (default: {DEFAULT_MIN_PSNR})")
+    parser.add_argument("--target-ssim", type=float, default=None,
+                        help="Search each image's encoder quality to reach this SSIM (e.g. 0.99) instead of quality=85")
+    parser.add_argument("--no-fast-load", dest="fast_load", action="store_false",
+                        help="Fully decode every image before resizing instead of using JPEG draft mode/reduce")
+    parser.add_argument("--lossless-jpeg", action="store_true",
+                        help="Optimize JPEGs that need no resize losslessly instead of re-encoding them")
+    parser.add_argument("--compare-reencode", action="store_true",
+                        help="With --lossless-jpeg, report bytes saved against a full re-encode")
+    parser.add_argument("--variants", action="store_true",
+                        help=f"Also generate responsive variants ({', '.join(map(str, VARIANT_WIDTHS))}px wide) and variants.json")
+    parser.add_argument("--index", action="store_true",
+                        help="Also write image_index.json with dimensions, dominant colour and BlurHash/LQIP placeholders")
+    parser.add_argument("--publish", type=Path, default=None, metavar="DIR",
+                        help="Also copy images to DIR under content-hashed names with a manifest.json, "
+                             "removing stale hashed files")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.force and cache_path.exists():
+        cache_path.unlink()
     
     # Compress images
-    renamed_files = compress_all_images(images_dir, quality=85, max_dimension=1920)
+    with profile(args.profile):
+        renamed_files = compress_all_images(images_dir, quality=85, max_dimension=1920,
+                                            workers=args.workers, cache_path=cache_path,
+                                            formats=args.formats, min_psnr=args.min_psnr,
+                                            target_ssim=args.target_ssim, fast_load=args.fast_load,
+                                            lossless_jpeg=args.lossless_jpeg, compare_reencode=args.compare_reencode,
+                                            journal_path=journal_path)
+    
+    if args.report:
+        print_stage_summary()
+        write_report(args.report)
     
-    # Update JSON if files were renamed
+    # Update JSON if files were renamed; once it is committed the journal is no longer needed
     if renamed_files and json_path.exists():
         update_json_paths(json_path, renamed_files)
+    journal_path.unlink(missing_ok=True)
+    
+    if args.variants:
+        generate_all_variants(images_dir, variants_dir, variants_manifest_path, quality=85, workers=args.workers)
+    
+    if args.index:
+        build_image_index(images_dir, index_path, workers=args.workers)
+    
+    if args.publish:
+        publish_hashed_images(images_dir, args.publish)
 
 if __name__ == "__main__":
     main()
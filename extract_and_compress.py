@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Extract images and text from PowerPoint presentation and compress the images
+in a single pass.
+
+Each embedded image is read from the PPTX zip and handed straight to a
+compression worker, so raw originals are never written to disk, and
+slides_data.json is written once with the final (compressed) filenames.
+"""
+
+import os
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from extract_pptx_content import extract_slide_content_streaming
+from instrumentation import add_record
+from compress_images import (
+    DEFAULT_MIN_PSNR,
+    ENCODERS,
+    _compress_one,
+    atomic_write_json,
+    compression_settings,
+    is_cached,
+    load_cache,
+    print_summary,
+    record_compressed,
+    rename_images,
+    save_cache,
+)
+
+def extract_and_compress(pptx_path, output_dir, quality=85, max_dimension=1920, workers=None, max_pending=None,
+                         cache_path=None, formats=None, min_psnr=DEFAULT_MIN_PSNR, target_ssim=None):
+    """
+    Extract a deck and compress its images, overlapping the two stages.
+    
+    Extraction runs in this process and submits each new image to a process
+    pool; at most max_pending images are in flight at once, which bounds
+    memory while keeping the workers busy.
+    
+    Args:
+        pptx_path: Path to the PowerPoint file
+        output_dir: Output directory (images go to output_dir/images)
+        quality, max_dimension, formats, min_psnr, target_ssim: As for
+            compress_images.compress_all_images
+        workers: Number of worker processes (None uses all CPU cores)
+        max_pending: Maximum images queued or being compressed (default: 2 per worker)
+        cache_path: Optional compression cache; images whose compressed
+            output is already on disk are not compressed again
+    
+    Returns:
+        The slides data, with image filenames pointing at the compressed files
+    """
+    output_dir = Path(output_dir)
+    images_dir = output_dir / "images"
+    workers = workers or os.cpu_count()
+    pending = threading.BoundedSemaphore(max_pending or 2 * workers)
+    
+    settings = compression_settings(quality, max_dimension, formats, min_psnr, target_ssim)
+    cache = load_cache(cache_path) if cache_path else {}
+    # Source hash -> compressed filename, for outputs still valid on disk
+    compressed_sources = {entry['source_sha256']: name for name, entry in cache.items()
+                          if is_cached(entry, images_dir / name, settings)}
+    
+    futures = []
+    renamed_files = {}
+    skipped_count = 0
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def save_media(zf, media_name, filepath, seen):
+            """Queue a media part for compression instead of copying it to disk."""
+            nonlocal skipped_count
+            data = zf.read(media_name)
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in seen:
+                return seen[digest]
+            seen[digest] = filepath.name
+            
+            if digest in compressed_sources:
+                skipped_count += 1
+                if compressed_sources[digest] != filepath.name:
+                    renamed_files[filepath.name] = compressed_sources[digest]
+                return filepath.name
+            
+            pending.acquire()
+            future = executor.submit(_compress_one, filepath, settings, data)
+            future.add_done_callback(lambda _: pending.release())
+            futures.append(future)
+            return filepath.name
+        
+        slides_data = extract_slide_content_streaming(pptx_path, output_dir, save_media)
+        
+        print(f"\nCompressing {len(futures)} images...")
+        total_original_size = 0
+        total_compressed_size = 0
+        compressed_count = 0
+        for future in futures:
+            result = future.result()
+            add_record(result['metrics'])
+            total_original_size += result['original_size']
+            print(result['log'], end="")
+            
+            if result['compressed_size'] is None:
+                continue
+            
+            total_compressed_size += result['compressed_size']
+            compressed_count += 1
+            record_compressed(result, settings, cache, renamed_files)
+    
+    if cache_path:
+        save_cache(cache_path, cache)
+    
+    rename_images(slides_data, renamed_files)
+    print_summary(compressed_count, len(futures), skipped_count, total_original_size, total_compressed_size)
+    
+    return slides_data
+
+def main():
+    """Main pipeline function."""
+    script_dir = Path(__file__).parent
+    pptx_path = script_dir / "LAW PARK.pptx"
+    output_dir = script_dir / "extracted_content"
+    cache_path = output_dir / "compression_cache.json"
+    
+    parser = argparse.ArgumentParser(description="Extract the PowerPoint deck and compress its images in one pass.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: all CPU cores)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Maximum images held in memory awaiting compression (default: 2 per worker)")
+    parser.add_argument("--formats", type=lambda value: value.split(','), default=None,
+                        help=f"Comma-separated encoders to choose from per image ({', '.join(ENCODERS)})")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help=f"Quality floor in dB for --formats (default: {DEFAULT_MIN_PSNR})")
+    parser.add_argument("--target-ssim", type=float, default=None,
+                        help="Search each image's encoder quality to reach this SSIM (e.g. 0.99)")
+    args = parser.parse_args()
+    
+    if not pptx_path.exists():
+        print(f"Error: PowerPoint file not found at {pptx_path}")
+        return
+    
+    print(f"Extracting and compressing: {pptx_path}")
+    print(f"Output directory: {output_dir}")
+    
+    slides_data = extract_and_compress(pptx_path, output_dir, quality=85, max_dimension=1920,
+                                       workers=args.workers, max_pending=args.max_pending, cache_path=cache_path,
+                                       formats=args.formats, min_psnr=args.min_psnr, target_ssim=args.target_ssim)
+    
+    # Save JSON mapping once, with the final filenames
+    json_path = output_dir / "slides_data.json"
+    atomic_write_json(json_path, slides_data, indent=2, ensure_ascii=False)
+    
+    print(f"\n  - Data saved to: {json_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Extract and compress many PowerPoint decks into a shared image store.
+
+Decks are extracted concurrently, one per worker process. Every image is
+stored once under output/images, named after the hash of its original
+bytes, so a photo reused across several years' decks is written and
+compressed only once.
+Each deck gets its own output/decks/<deck>.json in the slides_data.json
+format (image paths relative to output), and output/decks.json lists them
+all.
+"""
+
+import io
+import os
+import json
+import argparse
+import hashlib
+import posixpath
+from contextlib import redirect_stdout
+from functools import partial
+from pathlib import Path
+
+from compress_images import (
+    atomic_write_json,
+    compress_all_images,
+    map_in_pool,
+    update_json_paths,
+)
+from extract_pptx_content import COPY_CHUNK_SIZE, extract_slide_content_streaming, find_decks
+
+# Hex digits of the SHA-256 used to name images in the shared store
+ASSET_HASH_LENGTH = 16
+
+def _store_media(zf, media_name, filepath, seen, store, added):
+    """
+    save_media hook that copies a media part into the shared store.
+    
+    The part is copied in chunks while being hashed and saved as
+    <hash><ext>. If store (hash prefix -> filename) or the store directory
+    already has that content under any extension (e.g. a PNG since
+    compressed to .jpg, or an image another worker stored during this run),
+    the copy is discarded and the existing filename reused. Filenames this
+    call stored are appended to added.
+    """
+    # Unique per process, so concurrent workers never share a temporary file
+    tmp_path = filepath.with_name(f"{filepath.name}.{os.getpid()}.part")
+    digest = hashlib.sha256()
+    with zf.open(media_name) as src, open(tmp_path, 'wb') as dst:
+        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    
+    key = digest.hexdigest()[:ASSET_HASH_LENGTH]
+    if key not in store:
+        # Workers share the directory but not store, so look for a copy stored by another deck of this run
+        existing = [path.name for path in filepath.parent.glob(f"{key}.*") if not path.name.endswith('.part')]
+        if existing:
+            store[key] = existing[0]
+    if key in store:
+        os.remove(tmp_path)
+    else:
+        store[key] = key + filepath.suffix
+        # Two workers may still store the same content at once; the rename is atomic and the bytes identical
+        os.replace(tmp_path, filepath.with_name(store[key]))
+        added.append(store[key])
+    seen[key] = store[key]
+    return store[key]
+
+def _extract_deck_one(deck_path, settings):
+    """Extract one deck into the shared store for a worker, returning (deck_path, slides_data, log)."""
+    log = io.StringIO()
+    store = dict(settings['store'])
+    added = []
+    try:
+        with redirect_stdout(io.StringIO()):
+            slides_data = extract_slide_content_streaming(deck_path, Path(settings['output_dir']),
+                                                          partial(_store_media, store=store, added=added))
+        images = {img['filename'] for slide in slides_data for img in slide['images']}
+        log.write(f"Extracted: {deck_path.name} ({len(slides_data)} slides, {len(images)} images, {len(added)} new)\n")
+    except Exception as e:
+        slides_data = None
+        log.write(f"  Error extracting {deck_path}: {e}\n")
+    return deck_path, slides_data, log.getvalue()
+
+def _deck_names(deck_paths, manifest):
+    """
+    Map each deck path to a unique output name based on its filename.
+    
+    A deck already listed in manifest (decks.json of earlier runs) keeps its
+    name; names of other decks listed there are not reused.
+    """
+    previous = {Path(entry['source']).resolve(): name for name, entry in manifest.items()}
+    names = {}
+    used = set(manifest)
+    for deck_path in deck_paths:
+        if deck_path.resolve() in previous:
+            names[deck_path] = previous[deck_path.resolve()]
+            continue
+        name = deck_path.stem
+        suffix = 2
+        while name in used:
+            name = f"{deck_path.stem}_{suffix}"
+            suffix += 1
+        used.add(name)
+        names[deck_path] = name
+    return names
+
+def extract_decks(inputs, output_dir, workers=None, compress=True, quality=85, max_dimension=1920):
+    """
+    Extract every deck in inputs (see find_decks) into a shared image store.
+    
+    Args:
+        inputs: PPTX files, directories of them or glob patterns
+        output_dir: Output directory; images go to output_dir/images and
+            per-deck JSON to output_dir/decks
+        workers: Number of worker processes (1 runs in-process, None uses all CPU cores)
+        compress: Compress the store afterwards; images already compressed
+            by an earlier run are skipped via the compression cache
+        quality, max_dimension: As for compress_images.compress_all_images
+    
+    Returns:
+        Dict mapping deck name to its entry in decks.json, including decks
+        extracted by earlier runs
+    """
+    output_dir = Path(output_dir)
+    images_dir = output_dir / "images"
+    decks_dir = output_dir / "decks"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    decks_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Decks from earlier runs stay listed; decks extracted again replace their entries
+    manifest_path = output_dir / "decks.json"
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    
+    deck_paths = [p for p in find_decks(inputs) if p.suffix.lower() == '.pptx']
+    names = _deck_names(deck_paths, manifest)
+    # Store filenames by hash prefix, including files renamed by compression
+    store = {path.stem: path.name for path in images_dir.iterdir()
+             if path.is_file() and len(path.stem) == ASSET_HASH_LENGTH and not path.name.endswith('.part')}
+    print(f"Extracting {len(deck_paths)} decks into {images_dir} ({len(store)} images already stored)...")
+    
+    settings = {"output_dir": str(output_dir), "store": store}
+    written = 0
+    for deck_path, slides_data, log in map_in_pool(_extract_deck_one, deck_paths, settings, workers):
+        print(log, end="")
+        if slides_data is None:
+            continue
+        
+        name = names[deck_path]
+        json_path = decks_dir / f"{name}.json"
+        atomic_write_json(json_path, slides_data, indent=2, ensure_ascii=False)
+        written += 1
+        manifest[name] = {
+            "source": str(deck_path),
+            "data": posixpath.join("decks", json_path.name),
+            "slides": len(slides_data),
+            "images": sorted({img['filename'] for slide in slides_data for img in slide['images']}),
+        }
+    
+    if compress:
+        journal_path = output_dir / "compression_journal.jsonl"
+        renamed_files = compress_all_images(images_dir, quality=quality, max_dimension=max_dimension, workers=workers,
+                                            cache_path=output_dir / "compression_cache.json",
+                                            journal_path=journal_path)
+        if renamed_files:
+            # The store is shared, so decks from earlier runs may reference renamed images too
+            for json_path in sorted(decks_dir.glob('*.json')):
+                update_json_paths(json_path, renamed_files)
+            for entry in manifest.values():
+                entry['images'] = sorted(renamed_files.get(filename, filename) for filename in entry['images'])
+        journal_path.unlink(missing_ok=True)
+    
+    atomic_write_json(manifest_path, manifest, indent=2, sort_keys=True, ensure_ascii=False)
+    
+    shared = len({f for entry in manifest.values() for f in entry['images']})
+    referenced = sum(len(entry['images']) for entry in manifest.values())
+    print(f"\n{written} decks written to {decks_dir} ({len(manifest)} listed in decks.json); "
+          f"{shared} unique images stored for {referenced} per-deck image references")
+    return manifest
+
+def main():
+    """Main batch extraction function."""
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description="Extract and compress many PowerPoint decks into a shared image store.")
+    parser.add_argument("decks", nargs="+", help="PPTX files, directories of them or glob patterns (e.g. 'decks/*.pptx')")
+    parser.add_argument("--output", type=Path, default=script_dir / "extracted_decks",
+                        help="Output directory (default: extracted_decks)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: all CPU cores, 1 disables the pool)")
+    parser.add_argument("--no-compress", dest="compress", action="store_false",
+                        help="Only extract; leave the stored images uncompressed")
+    args = parser.parse_args()
+    
+    extract_decks(args.decks, args.output, workers=args.workers, compress=args.compress)
+
+if __name__ == "__main__":
+    main()
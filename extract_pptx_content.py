@@ -5,12 +5,33 @@ Creates a structured output for website development.
 """
 
 import os
+import glob
 import json
+import zipfile
+import argparse
+import posixpath
+import xml.etree.ElementTree as ET
 from pathlib import Path
 from pptx import Presentation
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 import hashlib
 
+from instrumentation import add_report_arguments, count, print_stage_summary, profile, stage, track_file, write_report
+
+# Chunk size for copying embedded media out of the PPTX zip
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# OOXML namespaces used by the streaming extractor
+NS = {
+    'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+
+# spTree children that python-pptx treats as shapes
+SHAPE_TAGS = {f"{{{NS['p']}}}{tag}" for tag in ('sp', 'grpSp', 'graphicFrame', 'cxnSp', 'pic', 'contentPart')}
+
 def sanitize_filename(text, max_length=50):
     """Create a safe filename from text."""
     if not text:
@@ -21,36 +42,76 @@ def sanitize_filename(text, max_length=50):
     cleaned = cleaned.replace(' ', '_').strip('_')
     return cleaned[:max_length] or "untitled"
 
+def find_decks(inputs):
+    """Expand PPTX/slides_data.json files, directories (their *.pptx) and glob patterns into deck paths."""
+    decks = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            matches = sorted(path.glob('*.pptx'))
+        elif path.exists():
+            matches = [path]
+        else:
+            matches = sorted(Path(p) for p in glob.glob(str(item), recursive=True))
+        # Skip PowerPoint's ~$ lock files
+        decks.extend(p for p in matches if not p.name.startswith('~$'))
+    # The same deck named twice (e.g. by path and by a glob) is read once
+    return list({p.resolve(): p for p in decks}.values())
+
 def extract_text_from_shape(shape):
     """Extract text from a shape."""
     if hasattr(shape, "text"):
         return shape.text.strip()
     return ""
 
-def extract_images_from_shape(shape, slide_num, shape_index, output_dir):
-    """Extract images from a shape and save them."""
+def image_base_name(slide_num, shape_index, shape_name):
+    """Generate a meaningful filename (without extension) for a picture shape."""
+    # Grouped pictures have string indices like "2_0"
+    index = f"{shape_index:02d}" if isinstance(shape_index, int) else shape_index
+    # Try to use alt text or shape name if available
+    image_name = f"slide_{slide_num:02d}_image_{index}"
+    if shape_name:
+        name_part = sanitize_filename(shape_name, 20)
+        if name_part != "Picture":
+            image_name = f"slide_{slide_num:02d}_{name_part}_{index}"
+    return image_name
+
+def extract_images_from_shape(shape, slide_num, shape_index, output_dir, seen=None):
+    """
+    Extract images from a shape and save them.
+    
+    Images are content-addressed: seen maps the SHA-256 of each blob already
+    written to its filename, and a repeated image reuses that file instead
+    of being written again.
+    """
     images = []
+    if seen is None:
+        seen = {}
     
     if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-        image = shape.image
-        image_bytes = image.blob
-        image_ext = image.ext
-        
-        # Generate a meaningful filename
-        # Try to use alt text or shape name if available
-        image_name = f"slide_{slide_num:02d}_image_{shape_index:02d}"
-        if hasattr(shape, 'name') and shape.name:
-            name_part = sanitize_filename(shape.name, 20)
-            if name_part != "Picture":
-                image_name = f"slide_{slide_num:02d}_{name_part}_{shape_index:02d}"
-        
-        filename = f"{image_name}.{image_ext}"
+        with track_file('extract', f"slide {slide_num} shape {shape_index}") as metrics:
+            with stage('read'):
+                image = shape.image
+                image_bytes = image.blob
+            image_ext = image.ext
+            count('bytes_in', len(image_bytes))
+            with stage('hash'):
+                digest = hashlib.sha256(image_bytes).hexdigest()
+            
+            if digest in seen:
+                filename = seen[digest]
+                count('duplicates')
+            else:
+                filename = f"{image_base_name(slide_num, shape_index, getattr(shape, 'name', None))}.{image_ext}"
+                seen[digest] = filename
+                
+                # Save image
+                with stage('write'), open(output_dir / filename, 'wb') as f:
+                    f.write(image_bytes)
+                count('bytes_out', len(image_bytes))
+            metrics['file'] = filename
         filepath = output_dir / filename
         
-        # Save image
-        with open(filepath, 'wb') as f:
-            f.write(image_bytes)
-        
         images.append({
             "filename": filename,
             "path": str(filepath.relative_to(output_dir.parent)),
@@ -60,7 +121,7 @@ def extract_images_from_shape(shape, slide_num, shape_index, output_dir):
     # Check for images in grouped shapes
     elif shape.shape_type == MSO_SHAPE_TYPE.GROUP:
         for i, sub_shape in enumerate(shape.shapes):
-            sub_images = extract_images_from_shape(sub_shape, slide_num, f"{shape_index}_{i}", output_dir)
+            sub_images = extract_images_from_shape(sub_shape, slide_num, f"{shape_index}_{i}", output_dir, seen)
             images.extend(sub_images)
     
     return images
@@ -74,6 +135,7 @@ def extract_slide_content(pptx_path, output_base_dir):
     images_dir.mkdir(parents=True, exist_ok=True)
     
     slides_data = []
+    seen = {}  # SHA-256 -> filename of images already written
     
     for slide_num, slide in enumerate(prs.slides, start=1):
         print(f"Processing slide {slide_num}...")
@@ -100,7 +162,7 @@ def extract_slide_content(pptx_path, output_base_dir):
                 })
             
             # Extract images
-            images = extract_images_from_shape(shape, slide_num, image_index, images_dir)
+            images = extract_images_from_shape(shape, slide_num, image_index, images_dir, seen)
             if images:
                 slide_data["images"].extend(images)
                 image_index += len(images)
@@ -120,12 +182,196 @@ def extract_slide_content(pptx_path, output_base_dir):
     
     return slides_data
 
+def _read_rels(zf, part_name):
+    """Map relationship ids to (absolute part name, is_external) for a part in the zip."""
+    rels_name = posixpath.join(posixpath.dirname(part_name), '_rels', posixpath.basename(part_name) + '.rels')
+    if rels_name not in zf.namelist():
+        return {}
+    
+    rels = {}
+    root = ET.fromstring(zf.read(rels_name))
+    for rel in root.findall('rel:Relationship', NS):
+        target = rel.get('Target')
+        external = rel.get('TargetMode') == 'External'
+        if not external:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+        rels[rel.get('Id')] = (target, external)
+    return rels
+
+def _slide_part_names(zf):
+    """Slide part names in presentation order."""
+    presentation = ET.fromstring(zf.read('ppt/presentation.xml'))
+    rels = _read_rels(zf, 'ppt/presentation.xml')
+    return [rels[sld_id.get(f"{{{NS['r']}}}id")][0]
+            for sld_id in presentation.findall('p:sldIdLst/p:sldId', NS)]
+
+def _shape_text(elm):
+    """Text of a p:sp element, matching python-pptx's shape.text."""
+    paragraphs = []
+    for paragraph in elm.findall('p:txBody/a:p', NS):
+        parts = []
+        for child in paragraph:
+            if child.tag == f"{{{NS['a']}}}br":
+                parts.append('\v')
+            elif child.tag in (f"{{{NS['a']}}}r", f"{{{NS['a']}}}fld"):
+                parts.append(child.findtext('a:t', default='', namespaces=NS))
+        paragraphs.append(''.join(parts))
+    return '\n'.join(paragraphs).strip()
+
+def _copy_media_dedup(zf, media_name, filepath, seen):
+    """
+    Copy a media part to filepath in chunks, hashing it on the way.
+    
+    If identical content was already written, the copy is discarded and the
+    existing filename is returned instead.
+    """
+    tmp_path = filepath.with_name(filepath.name + '.part')
+    digest = hashlib.sha256()
+    with track_file('extract', filepath.name) as metrics:
+        with stage('copy'), zf.open(media_name) as src, open(tmp_path, 'wb') as dst:
+            for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+                count('bytes_in', len(chunk))
+        
+        digest = digest.hexdigest()
+        if digest in seen:
+            os.remove(tmp_path)
+            count('duplicates')
+        else:
+            os.replace(tmp_path, filepath)
+            seen[digest] = filepath.name
+            count('bytes_out', filepath.stat().st_size)
+        metrics['file'] = seen[digest]
+    return seen[digest]
+
+def _stream_images_from_shape(zf, elm, rels, slide_num, shape_index, output_dir, seen, save_media):
+    """
+    Streaming counterpart of extract_images_from_shape for a shape XML element.
+    
+    seen maps both media part names and SHA-256 digests to the filename
+    already written for them; save_media is called as
+    save_media(zf, media_name, filepath, seen) for each new media part.
+    """
+    images = []
+    
+    # Pictures filling a placeholder are PLACEHOLDER shapes to python-pptx, so extract_images_from_shape skips them
+    if elm.tag == f"{{{NS['p']}}}pic" and elm.find('p:nvPicPr/p:nvPr/p:ph', NS) is None:
+        blip = elm.find('p:blipFill/a:blip', NS)
+        rel = rels.get(blip.get(f"{{{NS['r']}}}embed")) if blip is not None else None
+        if rel is None or rel[1]:
+            return images
+        
+        media_name = rel[0]
+        image_ext = posixpath.splitext(media_name)[1].lstrip('.').lower()
+        if image_ext == 'jpeg':
+            image_ext = 'jpg'
+        if media_name not in seen:
+            shape_name = elm.find('p:nvPicPr/p:cNvPr', NS).get('name')
+            filename = f"{image_base_name(slide_num, shape_index, shape_name)}.{image_ext}"
+            seen[media_name] = save_media(zf, media_name, output_dir / filename, seen)
+        filename = seen[media_name]
+        filepath = output_dir / filename
+        
+        images.append({
+            "filename": filename,
+            "path": str(filepath.relative_to(output_dir.parent)),
+            "shape_index": shape_index
+        })
+    
+    # Check for images in grouped shapes
+    elif elm.tag == f"{{{NS['p']}}}grpSp":
+        sub_shapes = [child for child in elm if child.tag in SHAPE_TAGS]
+        for i, sub_elm in enumerate(sub_shapes):
+            sub_images = _stream_images_from_shape(zf, sub_elm, rels, slide_num, f"{shape_index}_{i}", output_dir,
+                                                   seen, save_media)
+            images.extend(sub_images)
+    
+    return images
+
+def extract_slide_content_streaming(pptx_path, output_base_dir, save_media=None):
+    """
+    Extract all content from PowerPoint presentation without loading it whole.
+    
+    Produces the same slides data as extract_slide_content, but reads slide
+    XML and relationships directly from the PPTX zip and copies each
+    ppt/media part to disk in chunks, so memory use does not grow with the
+    size of the embedded images.
+    
+    save_media(zf, media_name, filepath, seen) can replace the default
+    chunked copy; it must return the filename the image ends up under and
+    record new content digests in seen.
+    """
+    if save_media is None:
+        save_media = _copy_media_dedup
+    
+    images_dir = output_base_dir / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    
+    slides_data = []
+    seen = {}  # media part name / SHA-256 -> filename of images already written
+    
+    with zipfile.ZipFile(pptx_path) as zf:
+        for slide_num, part_name in enumerate(_slide_part_names(zf), start=1):
+            print(f"Processing slide {slide_num}...")
+            
+            slide_data = {
+                "slide_number": slide_num,
+                "text_content": [],
+                "images": [],
+                "all_text": ""
+            }
+            
+            rels = _read_rels(zf, part_name)
+            sp_tree = ET.fromstring(zf.read(part_name)).find('p:cSld/p:spTree', NS)
+            shapes = [child for child in sp_tree if child.tag in SHAPE_TAGS]
+            
+            text_parts = []
+            image_index = 0
+            
+            for shape_index, elm in enumerate(shapes):
+                # Extract text
+                text = _shape_text(elm) if elm.tag == f"{{{NS['p']}}}sp" else ""
+                if text:
+                    text_parts.append(text)
+                    slide_data["text_content"].append({
+                        "shape_index": shape_index,
+                        "text": text
+                    })
+                
+                # Extract images
+                images = _stream_images_from_shape(zf, elm, rels, slide_num, image_index, images_dir, seen, save_media)
+                if images:
+                    slide_data["images"].extend(images)
+                    image_index += len(images)
+            
+            # Combine all text
+            slide_data["all_text"] = "\n\n".join(text_parts)
+            
+            # Generate slide title from first text element or use default
+            if text_parts:
+                first_text = text_parts[0].split('\n')[0].strip()
+                slide_data["title"] = sanitize_filename(first_text[:50]) or f"slide_{slide_num}"
+            else:
+                slide_data["title"] = f"slide_{slide_num}"
+            
+            slides_data.append(slide_data)
+            print(f"  - Found {len(slide_data['text_content'])} text elements and {len(slide_data['images'])} images")
+    
+    return slides_data
+
 def main():
     """Main extraction function."""
     script_dir = Path(__file__).parent
     pptx_path = script_dir / "LAW PARK.pptx"
     output_dir = script_dir / "extracted_content"
     
+    parser = argparse.ArgumentParser(description="Extract images and text from the PowerPoint deck.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Read slides and media straight from the PPTX zip, keeping memory flat for large decks")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    
     if not pptx_path.exists():
         print(f"Error: PowerPoint file not found at {pptx_path}")
         return
@@ -134,7 +380,11 @@ def main():
     print(f"Output directory: {output_dir}")
     
     # Extract content
-    slides_data = extract_slide_content(pptx_path, output_dir)
+    with profile(args.profile):
+        if args.streaming:
+            slides_data = extract_slide_content_streaming(pptx_path, output_dir)
+        else:
+            slides_data = extract_slide_content(pptx_path, output_dir)
     
     # Save JSON mapping
     json_path = output_dir / "slides_data.json"
@@ -148,7 +398,12 @@ def main():
     
     # Print summary
     total_images = sum(len(slide['images']) for slide in slides_data)
-    print(f"  - Total images extracted: {total_images}")
+    unique_images = len({img['filename'] for slide in slides_data for img in slide['images']})
+    print(f"  - Total images extracted: {total_images} ({unique_images} unique files)")
+    
+    if args.report:
+        print_stage_summary()
+        write_report(args.report)
 
 if __name__ == "__main__":
     main()
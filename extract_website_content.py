@@ -5,9 +5,20 @@ Extract content and images from the original Law Park Educational Trust website.
 
 import os
 import json
+import argparse
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+from instrumentation import add_report_arguments, count, print_stage_summary, profile, stage, track_file, write_report
+
+# Bytes per chunk when streaming downloads to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Default number of concurrent downloads
+DEFAULT_DOWNLOAD_WORKERS = 8
 
 # Website content extracted from browser
 WEBSITE_CONTENT = {
@@ -125,19 +136,156 @@ IMAGE_URLS = {
     ]
 }
 
-def download_image(url, output_path):
-    """Download an image from URL."""
+def create_session(pool_size=DEFAULT_DOWNLOAD_WORKERS):
+    """Create a requests session whose connection pool fits pool_size concurrent downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _is_unchanged(session, url, output_path, entry):
+    """
+    Check whether a previously downloaded file is still current.
+    
+    Uses a conditional GET when an ETag/Last-Modified was recorded, and
+    otherwise a HEAD request comparing Content-Length with the local size.
+    Returns (unchanged, response); response is an open streaming GET to
+    reuse when the file did change, or None.
+    """
+    if not entry or entry.get('url') != url or not output_path.exists():
+        return False, None
+    if output_path.stat().st_size != entry.get('size'):
+        return False, None
+    
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    
+    if not headers:
+        response = session.head(url, timeout=30, allow_redirects=True)
+        return response.ok and response.headers.get('Content-Length') == str(entry['size']), None
+    
+    response = session.get(url, headers=headers, stream=True, timeout=30)
+    if response.status_code == 304:
+        response.close()
+        return True, None
+    return False, response
+
+def fetch_asset(session, url, output_path, entry=None):
+    """
+    Download url to output_path unless the recorded entry shows it is unchanged.
+    
+    The body is streamed to a temporary file in chunks and renamed into
+    place only once complete, so an interrupted download never leaves a
+    truncated file behind.
+    
+    Args:
+        session: requests session (or the requests module) to use
+        url: URL to download
+        output_path: Destination path
+        entry: Validators recorded by a previous fetch_asset call, if any
+    
+    Returns:
+        Tuple of (status, entry) where status is 'downloaded', 'unchanged'
+        or 'failed' and entry holds the validators to record for next time
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + '.part')
+    
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        with track_file('download', output_path.name):
+            with stage('validate'):
+                unchanged, response = _is_unchanged(session, url, output_path, entry)
+            if unchanged:
+                count('unchanged')
+                return 'unchanged', entry
+            with stage('connect'):
+                if response is None:
+                    response = session.get(url, stream=True, timeout=30)
+            
+            with response:
+                response.raise_for_status()
+                
+                size = 0
+                chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+                with open(tmp_path, 'wb') as f:
+                    while True:
+                        with stage('download'):
+                            chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        with stage('write'):
+                            f.write(chunk)
+                        size += len(chunk)
+                os.replace(tmp_path, output_path)
+            count('bytes_in', size)
         
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-        
-        return True
+        return 'downloaded', {
+            "url": url,
+            "etag": response.headers.get('ETag'),
+            "last_modified": response.headers.get('Last-Modified'),
+            "size": size,
+        }
     except Exception as e:
         print(f"Error downloading {url}: {e}")
-        return False
+        if tmp_path.exists():
+            os.remove(tmp_path)
+        return 'failed', entry
+
+def download_image(url, output_path, session=None):
+    """Download an image from URL."""
+    status, _ = fetch_asset(session or requests, url, output_path)
+    return status != 'failed'
+
+def download_all(downloads, manifest_path=None, workers=DEFAULT_DOWNLOAD_WORKERS):
+    """
+    Download many files concurrently over a shared connection pool.
+    
+    Args:
+        downloads: List of (url, output_path) pairs
+        manifest_path: Optional JSON file of validators (ETag, Last-Modified,
+            size) from previous runs; files that are unchanged on the server
+            are skipped, and the manifest is updated afterwards
+        workers: Maximum concurrent downloads
+    
+    Returns:
+        Dict mapping each output path to its status
+    """
+    manifest = {}
+    if manifest_path and Path(manifest_path).exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    
+    statuses = {}
+    with create_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_asset, session, url, path, manifest.get(Path(path).name)): Path(path)
+            for url, path in downloads
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            status, entry = future.result()
+            statuses[path] = status
+            if entry:
+                manifest[path.name] = entry
+            if status == 'downloaded':
+                print(f"✓ Downloaded: {path.name}")
+            elif status == 'unchanged':
+                print(f"✓ Unchanged: {path.name}")
+    
+    if manifest_path:
+        # Write next to the manifest and rename, so an interrupted run never leaves it truncated
+        tmp_path = Path(manifest_path).with_name(Path(manifest_path).name + '.part')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+    
+    return statuses
 
 def main():
     """Main extraction function."""
@@ -148,36 +296,32 @@ def main():
     images_dir = website_dir / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
     
+    parser = argparse.ArgumentParser(description="Download images and content from the original website.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help=f"Maximum concurrent downloads (default: {DEFAULT_DOWNLOAD_WORKERS})")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    
     print("Downloading images from original website...")
     
-    # Download logo
-    logo_path = images_dir / "logo.png"
-    if download_image(IMAGE_URLS["logo"], logo_path):
-        print(f"✓ Downloaded logo: {logo_path.name}")
+    # Logo
+    downloads = [(IMAGE_URLS["logo"], images_dir / "logo.png")]
     
-    # Download homepage images
-    for i, url in enumerate(IMAGE_URLS["homepage_images"]):
-        ext = url.split('.')[-1]
-        filename = f"homepage_{i+1}.{ext}"
-        path = images_dir / filename
-        if download_image(url, path):
-            print(f"✓ Downloaded: {filename}")
+    # Homepage and about images
+    for prefix in ("homepage", "about"):
+        for i, url in enumerate(IMAGE_URLS[f"{prefix}_images"]):
+            ext = url.split('.')[-1]
+            downloads.append((url, images_dir / f"{prefix}_{i+1}.{ext}"))
     
-    # Download about images
-    for i, url in enumerate(IMAGE_URLS["about_images"]):
-        ext = url.split('.')[-1]
-        filename = f"about_{i+1}.{ext}"
-        path = images_dir / filename
-        if download_image(url, path):
-            print(f"✓ Downloaded: {filename}")
-    
-    # Download gallery images (limit to first 10 for now)
+    # Gallery images (limit to first 10 for now)
     for i, url in enumerate(IMAGE_URLS["gallery_images"][:10]):
         ext = url.split('.')[-1]
-        filename = f"gallery_{i+1}.{ext}"
-        path = images_dir / filename
-        if download_image(url, path):
-            print(f"✓ Downloaded: {filename}")
+        downloads.append((url, images_dir / f"gallery_{i+1}.{ext}"))
+    
+    # Validators from previous runs, so unchanged files are not fetched again
+    manifest_path = website_dir / "download_manifest.json"
+    with profile(args.profile):
+        download_all(downloads, manifest_path, workers=args.workers)
     
     # Save content as JSON
     content_path = website_dir / "website_content.json"
@@ -187,6 +331,10 @@ def main():
     print(f"\n✓ Content saved to: {content_path}")
     print(f"✓ Images saved to: {images_dir}")
     print("\nExtraction complete!")
+    
+    if args.report:
+        print_stage_summary()
+        write_report(args.report)
 
 if __name__ == "__main__":
     main()
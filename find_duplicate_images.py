@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate images (re-crops, re-exports, screenshots of the same
+photo) across the extracted slide images and the downloaded website images.
+
+Each image gets a 64-bit perceptual hash (pHash or dHash) computed with
+NumPy; hashes are indexed in a BK-tree so similar images are found without
+comparing every pair, and matches are grouped into clusters with a
+suggested canonical file to keep.
+"""
+
+import os
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from compress_images import find_images, map_in_pool, to_rgb
+
+# Side of the grayscale thumbnail the pHash DCT runs on
+PHASH_SIZE = 32
+
+# Side of the low-frequency DCT block (and of the dHash grid) -> 64-bit hashes
+HASH_SIZE = 8
+
+# Default maximum Hamming distance between near-duplicates
+DEFAULT_THRESHOLD = 8
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix of size n x n."""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+DCT_MATRIX = _dct_matrix(PHASH_SIZE)
+
+def _bits_to_int(bits):
+    """Pack a boolean array into an integer, most significant bit first."""
+    return int("".join('1' if bit else '0' for bit in bits.ravel()), 2)
+
+def _grayscale(img, size):
+    """Decode img at reduced size and return a (width, height) = size float grayscale array."""
+    img.draft('RGB', (size[0] * 4, size[1] * 4))
+    gray = to_rgb(img).convert('L').resize(size, Image.Resampling.LANCZOS)
+    return np.asarray(gray, dtype=np.float64)
+
+def phash(img):
+    """64-bit DCT perceptual hash: low-frequency coefficients compared to their median."""
+    pixels = _grayscale(img, (PHASH_SIZE, PHASH_SIZE))
+    coefficients = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+    return _bits_to_int(coefficients > np.median(coefficients))
+
+def dhash(img):
+    """64-bit difference hash: whether each pixel is brighter than its right neighbour."""
+    pixels = _grayscale(img, (HASH_SIZE + 1, HASH_SIZE))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+HASH_FUNCTIONS = {"phash": phash, "dhash": dhash}
+
+def _hash_one(img_path, settings):
+    """Hash one image for a worker, returning (img_path, info, log)."""
+    try:
+        with Image.open(img_path) as img:
+            width, height = img.size
+            value = HASH_FUNCTIONS[settings['hash']](img)
+        info = {"hash": value, "width": width, "height": height, "size": os.path.getsize(img_path)}
+        return img_path, info, ""
+    except Exception as e:
+        return img_path, None, f"  Error hashing {img_path}: {e}\n"
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+def bktree_add(tree, value, item):
+    """
+    Insert item under hash value into a BK-tree.
+    
+    A node is a list [value, items, children] where children maps a
+    distance to the child node at that distance; an empty tree is [].
+    """
+    if not tree:
+        tree.extend([value, [item], {}])
+        return
+    node = tree
+    while True:
+        distance = hamming(value, node[0])
+        if distance == 0:
+            node[1].append(item)
+            return
+        if distance not in node[2]:
+            node[2][distance] = [value, [item], {}]
+            return
+        node = node[2][distance]
+
+def bktree_search(tree, value, threshold):
+    """Return (item, distance) for every item whose hash is within threshold of value."""
+    matches = []
+    stack = [tree] if tree else []
+    while stack:
+        node_value, items, children = stack.pop()
+        distance = hamming(value, node_value)
+        if distance <= threshold:
+            matches.extend((item, distance) for item in items)
+        # Triangle inequality: only subtrees in [distance - threshold, distance + threshold] can match
+        for child_distance, child in children.items():
+            if distance - threshold <= child_distance <= distance + threshold:
+                stack.append(child)
+    return matches
+
+def find_duplicate_clusters(image_dirs, hash_name="phash", threshold=DEFAULT_THRESHOLD, workers=1):
+    """
+    Group near-duplicate images from several directories.
+    
+    Returns:
+        List of clusters, largest first; each is a dict with the suggested
+        canonical path (highest resolution, then largest file) and the other
+        members with their Hamming distance to it
+    """
+    image_files = sorted(path for image_dir in image_dirs if Path(image_dir).exists()
+                         for path in find_images(image_dir))
+    print(f"Hashing {len(image_files)} images ({hash_name})...")
+    
+    infos = {}
+    for img_path, info, log in map_in_pool(_hash_one, image_files, {"hash": hash_name}, workers):
+        print(log, end="")
+        if info:
+            infos[img_path] = info
+    
+    tree = []
+    for img_path, info in infos.items():
+        bktree_add(tree, info['hash'], img_path)
+    
+    # Union-find over all pairs the BK-tree reports as close
+    parent = {path: path for path in infos}
+    
+    def find(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+    
+    for img_path, info in infos.items():
+        for match, _ in bktree_search(tree, info['hash'], threshold):
+            parent[find(match)] = find(img_path)
+    
+    groups = {}
+    for img_path in infos:
+        groups.setdefault(find(img_path), []).append(img_path)
+    
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        canonical = max(members, key=lambda p: (infos[p]['width'] * infos[p]['height'], infos[p]['size'], str(p)))
+        clusters.append({
+            "canonical": str(canonical),
+            "duplicates": [
+                {"path": str(p), "distance": hamming(infos[p]['hash'], infos[canonical]['hash'])}
+                for p in sorted(members) if p != canonical
+            ],
+        })
+    clusters.sort(key=lambda c: (-len(c['duplicates']), c['canonical']))
+    return clusters
+
+def main():
+    """Main duplicate detection function."""
+    script_dir = Path(__file__).parent
+    default_dirs = [
+        script_dir / "extracted_content" / "images",
+        script_dir / "website" / "public" / "website_content" / "images",
+    ]
+    
+    parser = argparse.ArgumentParser(description="Find near-duplicate images across slides and the website gallery.")
+    parser.add_argument("dirs", nargs="*", type=Path, default=default_dirs,
+                        help="Image directories to scan (default: extracted slide images and website images)")
+    parser.add_argument("--hash", choices=sorted(HASH_FUNCTIONS), default="phash", help="Perceptual hash to use")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"Maximum differing bits (of 64) for near-duplicates (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: all CPU cores, 1 disables the pool)")
+    parser.add_argument("--output", type=Path, default=script_dir / "duplicate_clusters.json",
+                        help="Where to write the clusters JSON")
+    args = parser.parse_args()
+    
+    clusters = find_duplicate_clusters(args.dirs, args.hash, args.threshold, args.workers)
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(clusters, f, indent=2, ensure_ascii=False)
+    
+    redundant = sum(len(cluster['duplicates']) for cluster in clusters)
+    print(f"\nFound {len(clusters)} duplicate clusters ({redundant} redundant images)")
+    for cluster in clusters:
+        print(f"  Keep {cluster['canonical']}")
+        for duplicate in cluster['duplicates']:
+            print(f"    ~ {duplicate['path']} (distance {duplicate['distance']})")
+    print(f"\nClusters saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Lightweight per-file timers and counters for the extraction, download and
+compression scripts, with JSON/CSV run reports and an optional cProfile hook.
+
+Work on one file is wrapped in track_file(); inside it, stage() times a
+named stage (decode, resize, encode, write, download, ...) and count() adds
+to a counter (bytes_in, bytes_out, ...). Stages and counters outside a
+tracked file are ignored, so shared helpers can be instrumented freely.
+Records made in worker processes are returned to the parent with the
+worker's result and merged with add_record().
+"""
+
+import os
+import csv
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Finished file records of this process (and those merged from workers)
+RECORDS = []
+
+_lock = threading.Lock()
+_local = threading.local()
+_started = time.perf_counter()
+
+@contextmanager
+def track_file(kind, name):
+    """
+    Record the stages and counters of one file's processing.
+    
+    Nested calls on the same thread reuse the outer record, so a helper can
+    track itself whether or not its caller already does.
+    
+    Yields:
+        The record dict (kind, file, pid, seconds, stages, counters)
+    """
+    current = getattr(_local, 'record', None)
+    if current is not None:
+        yield current
+        return
+    
+    record = {"kind": kind, "file": str(name), "pid": os.getpid(), "seconds": 0.0, "stages": {}, "counters": {}}
+    _local.record = record
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _local.record = None
+        with _lock:
+            RECORDS.append(record)
+
+@contextmanager
+def stage(name):
+    """Add the time spent in the block to stage name of the current file."""
+    record = getattr(_local, 'record', None)
+    if record is None:
+        yield
+        return
+    
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['stages'][name] = record['stages'].get(name, 0.0) + time.perf_counter() - start
+
+def count(name, value=1):
+    """Add value to counter name of the current file."""
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record['counters'][name] = record['counters'].get(name, 0) + value
+
+def add_record(record):
+    """Merge a record returned from a worker process (records of this process are already kept)."""
+    if record and record['pid'] != os.getpid():
+        with _lock:
+            RECORDS.append(record)
+
+def summarize(records=None):
+    """
+    Aggregate records by kind.
+    
+    Returns:
+        Dict mapping kind to its file count, total seconds, per-stage
+        totals (count, seconds, mean, max), counter totals and throughput
+        (files/sec and counter bytes/sec over the summed file time)
+    """
+    summary = {}
+    for record in RECORDS if records is None else records:
+        kind = summary.setdefault(record['kind'], {"files": 0, "seconds": 0.0, "stages": {}, "counters": {}})
+        kind['files'] += 1
+        kind['seconds'] += record['seconds']
+        for name, seconds in record['stages'].items():
+            entry = kind['stages'].setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+        for name, value in record['counters'].items():
+            kind['counters'][name] = kind['counters'].get(name, 0) + value
+    
+    for kind in summary.values():
+        for entry in kind['stages'].values():
+            entry['mean'] = entry['seconds'] / entry['count']
+        kind['throughput'] = {"files_per_sec": kind['files'] / kind['seconds'] if kind['seconds'] else None}
+        for name, value in kind['counters'].items():
+            if name.startswith('bytes') and kind['seconds']:
+                kind['throughput'][f"{name}_per_sec"] = value / kind['seconds']
+    return summary
+
+def write_report(path, records=None):
+    """
+    Write a run report; the format follows the suffix.
+    
+    .csv writes one row per file with a column per stage and counter;
+    anything else writes JSON with the per-file records and the summary.
+    """
+    path = Path(path)
+    records = RECORDS if records is None else records
+    
+    if path.suffix.lower() == '.csv':
+        stages = sorted({name for record in records for name in record['stages']})
+        counters = sorted({name for record in records for name in record['counters']})
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'file', 'pid', 'seconds'] + [f"{name}_seconds" for name in stages] + counters)
+            for record in records:
+                writer.writerow([record['kind'], record['file'], record['pid'], f"{record['seconds']:.6f}"]
+                                + [f"{record['stages'][name]:.6f}" if name in record['stages'] else '' for name in stages]
+                                + [record['counters'].get(name, '') for name in counters])
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "wall_seconds": time.perf_counter() - _started,
+                "summary": summarize(records),
+                "files": records,
+            }, f, indent=2)
+    print(f"Run report saved to: {path}")
+
+def print_stage_summary(records=None):
+    """Print total and mean time per stage for each kind of record."""
+    for kind, entry in summarize(records).items():
+        print(f"\n{kind}: {entry['files']} files in {entry['seconds']:.2f}s")
+        for name, stage_entry in sorted(entry['stages'].items(), key=lambda item: -item[1]['seconds']):
+            print(f"  {name:10s} {stage_entry['seconds']:8.2f}s total  {stage_entry['mean'] * 1000:8.1f} ms mean  "
+                  f"{stage_entry['max'] * 1000:8.1f} ms max")
+
+@contextmanager
+def profile(path=None):
+    """
+    Run the block under cProfile and dump the stats to path (no-op without a path).
+    
+    Only this process is profiled; run with one worker to include the work
+    itself. Inspect the output with `python -m pstats <path>` or snakeviz.
+    """
+    if not path:
+        yield
+        return
+    
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile saved to: {path}")
+
+def add_report_arguments(parser):
+    """Add the --report and --profile options shared by the scripts."""
+    parser.add_argument("--report", type=Path, default=None, metavar="PATH",
+                        help="Write per-file and aggregate stage timings, bytes and throughput (.json or .csv)")
+    parser.add_argument("--profile", type=Path, default=None, metavar="PATH",
+                        help="Run under cProfile and save the stats to PATH (use --workers 1 to profile the work itself)")
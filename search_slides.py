@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Index and search the slide text of many PowerPoint decks.
+
+Decks (PPTX files, or slides_data.json files from earlier extractions) are
+read in parallel and their text tokenized into an inverted index, written
+as a single binary file. Searches memory-map that file and binary-search
+its sorted term table, so a query only reads the terms and slides it hits.
+"""
+
+import io
+import re
+import json
+import mmap
+import time
+import struct
+import argparse
+import tempfile
+import unicodedata
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+
+import numpy as np
+
+from compress_images import atomic_write, map_in_pool
+from extract_pptx_content import extract_slide_content_streaming, find_decks
+
+# Index file layout: header, then term offsets, term bytes, postings offsets,
+# postings (slide ids), slide offsets and slide records; offsets are uint32
+INDEX_MAGIC = b'SLIDEIX1'
+HEADER = struct.Struct('<8sII6Q')
+
+# Words are runs of letters/digits; a trailing * in a query matches a prefix
+TOKEN = re.compile(r'\w+')
+QUERY_TOKEN = re.compile(r'\w+\*?')
+
+def normalize(text):
+    """Casefold text and strip accents so 'Café' and 'cafe' match."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def tokenize(text):
+    """Split text into normalized index terms."""
+    return TOKEN.findall(normalize(text))
+
+def _media_part(zf, media_name, filepath, seen):
+    """save_media hook that names each image after its part in the PPTX zip, without reading it."""
+    return media_name
+
+def _index_one(deck_path, settings):
+    """Read one deck's slides and terms for a worker, returning (deck_path, slides, log)."""
+    log = io.StringIO()
+    try:
+        if deck_path.suffix.lower() == '.json':
+            # extracted_content/slides_data.json, or extract_decks.py's decks/<deck>.json
+            deck = deck_path.parent.name if deck_path.name == 'slides_data.json' else deck_path.stem
+            with open(deck_path, 'r', encoding='utf-8') as f:
+                slides_data = json.load(f)
+            image_ref = lambda img: img['path']
+        else:
+            deck = deck_path.stem
+            with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(io.StringIO()):
+                slides_data = extract_slide_content_streaming(deck_path, Path(tmp_dir), _media_part)
+            # Nothing is extracted, so point into the deck itself (e.g. 'deck.pptx#ppt/media/image1.jpg')
+            image_ref = lambda img: f"{deck_path.name}#{img['filename']}"
+    except Exception as e:
+        log.write(f"  Error reading {deck_path}: {e}\n")
+        return deck_path, None, log.getvalue()
+    
+    slides = []
+    for slide in slides_data:
+        text = slide.get('all_text', '')
+        slides.append({
+            "deck": deck,
+            "slide_number": slide['slide_number'],
+            "heading": text.strip().split('\n')[0][:80],
+            "images": [image_ref(img) for img in slide.get('images', [])],
+            "terms": sorted(set(tokenize(text))),
+        })
+    log.write(f"Indexed: {deck_path.name} ({len(slides)} slides)\n")
+    return deck_path, slides, log.getvalue()
+
+def _u32(values):
+    """Pack integers as a little-endian uint32 array."""
+    return np.asarray(values, dtype='<u4').tobytes()
+
+def write_index(index_path, slides):
+    """Write the inverted index of slides (as returned by _index_one) to index_path."""
+    postings = {}
+    for slide_id, slide in enumerate(slides):
+        for term in slide['terms']:
+            postings.setdefault(term, []).append(slide_id)
+    terms = sorted(postings)
+    
+    term_bytes = [term.encode('utf-8') for term in terms]
+    records = [json.dumps({k: v for k, v in slide.items() if k != 'terms'}, ensure_ascii=False).encode('utf-8')
+               for slide in slides]
+    sections = [
+        _u32(np.cumsum([0] + [len(t) for t in term_bytes])),
+        b''.join(term_bytes),
+        _u32(np.cumsum([0] + [len(postings[t]) for t in terms])),
+        _u32([slide_id for t in terms for slide_id in postings[t]]),
+        _u32(np.cumsum([0] + [len(r) for r in records])),
+        b''.join(records),
+    ]
+    
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = HEADER.pack(INDEX_MAGIC, len(terms), len(slides), *offsets)
+    atomic_write(index_path, header + b''.join(sections))
+    return len(terms)
+
+def build_index(inputs, index_path, workers=None):
+    """
+    Index every deck in inputs (see find_decks) into index_path, reading decks in parallel.
+    
+    Returns:
+        Tuple of (slide count, term count)
+    """
+    decks = find_decks(inputs)
+    print(f"Indexing {len(decks)} decks...")
+    
+    slides = []
+    for _, deck_slides, log in map_in_pool(_index_one, decks, {}, workers):
+        print(log, end="")
+        if deck_slides:
+            slides.extend(deck_slides)
+    
+    term_count = write_index(index_path, slides)
+    print(f"Index saved to: {index_path} ({len(slides)} slides, {term_count} terms, "
+          f"{Path(index_path).stat().st_size / 1024:.1f} KB)")
+    return len(slides), term_count
+
+@contextmanager
+def open_index(index_path):
+    """Memory-map an index file; yields a dict of its sections for search_index."""
+    with open(index_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, term_count, slide_count, *offsets = HEADER.unpack_from(mm)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path} is not a slide index")
+        term_offsets, terms, postings_offsets, postings, slide_offsets, slides = offsets
+        index = {
+            "mmap": mm,
+            "term_count": term_count,
+            "term_offsets": np.frombuffer(mm, dtype='<u4', count=term_count + 1, offset=term_offsets),
+            "terms": terms,
+            "postings_offsets": np.frombuffer(mm, dtype='<u4', count=term_count + 1, offset=postings_offsets),
+            "postings": postings,
+            "slide_offsets": np.frombuffer(mm, dtype='<u4', count=slide_count + 1, offset=slide_offsets),
+            "slides": slides,
+        }
+        try:
+            yield index
+        finally:
+            # Release the views before the mmap closes
+            index.clear()
+
+def _term_at(index, i):
+    """Bytes of term i."""
+    start, end = index['term_offsets'][i:i + 2]
+    return index['mmap'][index['terms'] + int(start):index['terms'] + int(end)]
+
+def _lower_bound(index, key):
+    """Position of the first term >= key (bytes) in the sorted term table."""
+    low, high = 0, index['term_count']
+    while low < high:
+        middle = (low + high) // 2
+        if _term_at(index, middle) < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def _postings(index, first, last):
+    """Sorted unique slide ids of the terms first..last-1."""
+    start, end = int(index['postings_offsets'][first]), int(index['postings_offsets'][last])
+    ids = np.frombuffer(index['mmap'], dtype='<u4', count=end - start, offset=index['postings'] + 4 * start)
+    return ids if last - first == 1 else np.unique(ids)
+
+def search_index(index, query, limit=None):
+    """
+    Find the slides containing every word of query.
+    
+    Words are matched after normalize(); a word ending in * matches any term
+    with that prefix (e.g. 'scholar*').
+    
+    Returns:
+        List of slide dicts (deck, slide_number, heading, images)
+    """
+    matches = None
+    for word in QUERY_TOKEN.findall(normalize(query)):
+        key = word.rstrip('*').encode('utf-8')
+        first = _lower_bound(index, key)
+        if word.endswith('*'):
+            # 0xff never occurs in UTF-8, so key + b'\xff' sorts after every term starting with key
+            last = _lower_bound(index, key + b'\xff')
+        elif first < index['term_count'] and _term_at(index, first) == key:
+            last = first + 1
+        else:
+            last = first
+        ids = _postings(index, first, last) if last > first else np.empty(0, dtype='<u4')
+        matches = ids if matches is None else np.intersect1d(matches, ids, assume_unique=True)
+        if not matches.size:
+            break
+    
+    results = []
+    for slide_id in (matches if matches is not None else [])[:limit]:
+        start, end = index['slide_offsets'][slide_id:slide_id + 2]
+        results.append(json.loads(index['mmap'][index['slides'] + int(start):index['slides'] + int(end)]))
+    return results
+
+def main():
+    """Main index/search function."""
+    script_dir = Path(__file__).parent
+    default_index = script_dir / "extracted_content" / "slide_index.bin"
+    
+    parser = argparse.ArgumentParser(description="Index and search slide text across PowerPoint decks.")
+    parser.add_argument("--index", type=Path, default=default_index, help=f"Index file (default: {default_index})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    build = commands.add_parser("build", help="Build the index from decks")
+    build.add_argument("inputs", nargs="*", default=[str(script_dir / "extracted_content" / "slides_data.json")],
+                       help="PPTX files, directories of them, glob patterns or slides_data.json files "
+                            "(default: extracted_content/slides_data.json)")
+    build.add_argument("--workers", type=int, default=None,
+                       help="Number of worker processes (default: all CPU cores, 1 disables the pool)")
+    
+    search = commands.add_parser("search", help="Search the index")
+    search.add_argument("query", help="Words that must all appear on the slide; end a word with * for a prefix")
+    search.add_argument("--limit", type=int, default=20, help="Maximum results to show (default: 20)")
+    search.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    
+    if args.command == "build":
+        build_index(args.inputs, args.index, workers=args.workers)
+        return
+    
+    with open_index(args.index) as index:
+        start = time.perf_counter()
+        results = search_index(index, args.query, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+    
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    for result in results:
+        print(f"{result['deck']} slide {result['slide_number']}: {result['heading']}")
+        for image in result['images']:
+            print(f"    {image}")
+    print(f"\n{len(results)} results in {elapsed:.2f} ms")
+
+if __name__ == "__main__":
+    main()